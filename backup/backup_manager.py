@@ -1,9 +1,22 @@
 import os
+from contextlib import ExitStack
 from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
 from backup.mysql_backup import MySQLBackup
 from backup.postgres_backup import PostgresBackup
 from configuration_files.exceptions import ConfigError, BackupManagerError, BackupError
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+# Buffer size for backup files; chunks are written as they are produced
+WRITE_BUFFER_SIZE = 1 << 20
+# File name of each MySQL section kind written by save_multiple_files, formatted with the table name;
+# other kinds (header, views, footer) are not saved
+SECTION_FILE_NAMES = {
+    'structure': "{}.structure.ddl",
+    'data': "{}.data.dml",
+    'permissions': "{}.permissions.dpl",
+}
 
 
 class BackupManager:
@@ -27,37 +40,72 @@ class BackupManager:
         except ValueError as e:
             raise ConfigError(f"Invalid database type provided: {db_type}") from e
 
-    def backup(self, backup_type: str, tables: Optional[List[str]], include_permissions: bool = False) -> str:
+    def backup(self, backup_type: str, tables: Optional[List[str]], include_permissions: bool = False,
+               jobs: int = 1, use_copy: bool = False) -> Iterator[Union[str, Tuple[str, str, str]]]:
         """
         Perform the backup for the specified tables and backup type.
 
+        The backup is produced lazily: nothing is read from the database until the result is iterated.
+        The connection stays open afterwards, so several backups can be taken before close().
+
         Args:
             backup_type (str): Type of backup to perform. Options: 'structure', 'data', 'structure_data'.
             tables (Optional[List[str]]): List of tables to include in the backup. If None, all tables are included.
             include_permissions (bool): Whether to include table permissions in the backup.
+            jobs (int): Number of tables backed up concurrently, each on its own database connection.
+            use_copy (bool): Whether to dump PostgreSQL table data as COPY blocks. Ignored for MySQL.
 
-        Returns:
-            str: The SQL backup script.
+        Yields:
+            Union[str, Tuple[str, str, str]]: Chunks of the SQL backup script for PostgreSQL,
+            or (table name, section kind, chunk) triples for MySQL.
 
         Raises:
             BackupError: If there is an error during the backup process.
         """
         try:
-            if self.backup_instance:
-                return self.backup_instance.backup(backup_type, tables, include_permissions)
+            if self.db_type == 'postgres':
+                yield from self.backup_instance.backup(backup_type, tables, include_permissions, jobs, use_copy)
             else:
-                return self.backup_instance.backup(backup_type, tables, include_permissions)
+                yield from self.backup_instance.backup(backup_type, tables, include_permissions, jobs)
         except BackupManagerError as e:
             raise BackupError(f"Failed to perform backup: {str(e)}") from e
 
+    def close(self) -> None:
+        """
+        Close the database connection of the backup instance.
+        """
+        self.backup_instance.close()
+
+    def __enter__(self) -> 'BackupManager':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @staticmethod
+    def _iter_chunks(backup_data: Iterable, db_type: Optional[str]) -> Iterable[str]:
+        """
+        Flatten the backup produced by a backend into consecutive chunks of SQL text.
+
+        Args:
+            backup_data (Iterable): The backup as returned by BackupManager.backup.
+            db_type (Optional[str]): The type of the database. Supported values: 'mysql', 'postgres'.
+
+        Returns:
+            Iterable[str]: The chunks of the SQL backup script, in order.
+        """
+        if db_type == 'mysql':
+            return (chunk for _, _, chunk in backup_data)
+        return backup_data
+
     @staticmethod
-    def save_backup_data(backup_data: str, output_file: Optional[str] = None, version: Optional[str] = None,
+    def save_backup_data(backup_data: Iterable, output_file: Optional[str] = None, version: Optional[str] = None,
                          db_type: Optional[str] = None) -> None:
         """
         Save the backup data to a file or print it to the console.
 
         Args:
-            backup_data (str): The SQL backup script to save.
+            backup_data (Iterable): The backup as returned by BackupManager.backup.
             output_file (Optional[str]): The name of the output file. If None, print the backup data.
             version (Optional[str]): The version to append to the file name.
             db_type (Optional[str]): The type of the database. Supported values: 'mysql', 'postgres'.
@@ -72,36 +120,35 @@ class BackupManager:
             else:
                 new_filename = output_file
             try:
-                if db_type == 'mysql':
-                    with open(os.path.join('./single_backups', new_filename), 'w', encoding='utf-8') as f:
-                        backup_data_str = ''.join(''.join(item) for item in backup_data.values())
-                        f.write(backup_data_str)
-                elif db_type == 'postgres':
-                    with open(os.path.join('./single_backups', new_filename), 'w', encoding='utf-8') as f:
-                        f.write(backup_data)
+                if db_type in ('mysql', 'postgres'):
+                    with open(os.path.join('./single_backups', new_filename), 'w', encoding='utf-8',
+                              buffering=WRITE_BUFFER_SIZE) as f:
+                        f.writelines(BackupManager._iter_chunks(backup_data, db_type))
             except PermissionError as e:
                 raise BackupError("Permission denied") from e
         else:
-            print(''.join(''.join(item) for item in backup_data.values()))
+            for chunk in BackupManager._iter_chunks(backup_data, db_type):
+                print(chunk, end='')
 
     @staticmethod
-    def save_multiple_files(backup_data: Dict[str, List[str]]) -> None:
+    def save_multiple_files(backup_data: Iterable[Tuple[str, str, str]]) -> None:
         """
         Save the backup data for multiple tables into separate files.
 
         Args:
-            backup_data (Dict[str, List[str]]): The backup data for each table, categorized by content type.
+            backup_data (Iterable[Tuple[str, str, str]]): The (table name, section kind, chunk) triples of a
+                MySQL backup, as returned by BackupManager.backup.
         """
         os.makedirs('./multiple_backups', exist_ok=True)
-        for table, data in backup_data.items():
-            for content in data:
-                if 'Permissions' in content:
-                    filename = f"{table}.permissions.dpl"
-                elif 'Table structure' in content:
-                    filename = f"{table}.structure.ddl"
-                elif 'Data for table' in content:
-                    filename = f"{table}.data.dml"
-                else:
-                    continue
-                with open(os.path.join('./multiple_backups', filename), 'w', encoding='utf-8') as f:
-                    f.write(content)
+        for table, sections in groupby(backup_data, key=itemgetter(0)):
+            # Each file of a table is opened on its first chunk and stays open until the table is done
+            with ExitStack() as stack:
+                files: Dict[str, TextIO] = {}
+                for _, kind, chunk in sections:
+                    if kind not in SECTION_FILE_NAMES:
+                        continue
+                    if kind not in files:
+                        files[kind] = stack.enter_context(
+                            open(os.path.join('./multiple_backups', SECTION_FILE_NAMES[kind].format(table)), 'w',
+                                 encoding='utf-8', buffering=WRITE_BUFFER_SIZE))
+                    files[kind].write(chunk)
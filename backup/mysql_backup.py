@@ -1,8 +1,24 @@
 import pymysql
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from queue import Queue
+from pymysql.constants import CLIENT, FIELD_TYPE
+from pymysql.cursors import SSCursor
 from tqdm import tqdm
 from datetime import datetime
+from functools import lru_cache
+from backup.parallel import close_connection_pool, map_bounded, open_connection_pool
 from configuration_files.exceptions import DatabaseConnectionError, BackupError
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Number of rows fetched from the server at a time
+FETCH_BATCH_SIZE = 10000
+# Number of SHOW CREATE TABLE statements sent to the server in one round-trip
+SHOW_CREATE_BATCH_SIZE = 100
+# Limits for a single extended INSERT statement. The size matches mysqldump's default net_buffer_length, so dumps
+# import well under max_allowed_packet, which defaults to 4 MiB on MySQL 5.7
+MAX_INSERT_ROWS = 1000
+MAX_INSERT_SIZE = 1024 * 1024  # in bytes of the UTF-8 encoded statement
 
 
 def _generate_backup_footer() -> str:
@@ -18,23 +34,90 @@ def _generate_backup_footer() -> str:
 """
 
 
+@lru_cache(maxsize=4096)
+def _quote_datetime(value: datetime) -> str:
+    # Cached: timestamp columns of audit and log tables repeat the same values a lot
+    return "'" + value.strftime('%Y-%m-%d %H:%M:%S') + "'"
+
+
 def _format_value(value) -> str:
+    # Checks are ordered by how often the types occur in table data; bool must precede int
     if value is None:
         return 'NULL'
     elif isinstance(value, str):
         return "'" + value.replace("'", "''") + "'"
     elif isinstance(value, bool):
         return 'TRUE' if value else 'FALSE'
-    elif isinstance(value, datetime):
-        return "'" + value.strftime('%Y-%m-%d %H:%M:%S') + "'"
     elif isinstance(value, (int, float)):
         return str(value)
+    elif isinstance(value, datetime):
+        return _quote_datetime(value)
     elif isinstance(value, bytes):
         return "0x" + value.hex()
     else:
         return "'" + str(value).replace("'", "''") + "'"
 
 
+# Column types that pymysql always returns as int or float (or None)
+_NUMERIC_FIELD_TYPES = frozenset([FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG, FIELD_TYPE.INT24,
+                                  FIELD_TYPE.LONGLONG, FIELD_TYPE.YEAR, FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE])
+
+
+_DATETIME_FIELD_TYPES = frozenset([FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP])
+
+
+def _format_number(value) -> str:
+    return 'NULL' if value is None else str(value)
+
+
+def _format_datetime(value) -> str:
+    # Zero dates such as '0000-00-00 00:00:00' come back as str and take the generic path
+    return _quote_datetime(value) if type(value) is datetime else _format_value(value)
+
+
+def _pick_formatter(type_code: int):
+    """Select the value formatter for a column once, based on its type code from cursor.description."""
+    if type_code in _NUMERIC_FIELD_TYPES:
+        return _format_number
+    if type_code in _DATETIME_FIELD_TYPES:
+        return _format_datetime
+    return _format_value
+
+
+def _quote_identifier(name: str) -> str:
+    """Quote a table or column name in backticks, doubling the backticks inside it."""
+    return '`' + name.replace('`', '``') + '`'
+
+
+def _iter_rows(cursor) -> Iterator[tuple]:
+    """
+    Yield the rows of the current result set, fetched FETCH_BATCH_SIZE at a time.
+    """
+    while rows := cursor.fetchmany(FETCH_BATCH_SIZE):
+        yield from rows
+
+
+def _chunk_insert_statements(insert_statement_prefix: str, values: Iterable[str]) -> Iterator[str]:
+    """
+    Group formatted value tuples into INSERT statements of at most MAX_INSERT_ROWS rows
+    and MAX_INSERT_SIZE bytes each; a single larger tuple gets a statement of its own.
+    """
+    # Sizes include the ',\n' after each tuple and the ';\n' after the last one
+    prefix_size = len(insert_statement_prefix.encode('utf-8'))
+    values_list = []
+    statement_size = prefix_size
+    for value in values:
+        value_size = len(value.encode('utf-8')) + 2
+        if values_list and (len(values_list) >= MAX_INSERT_ROWS or statement_size + value_size > MAX_INSERT_SIZE):
+            yield insert_statement_prefix + ',\n'.join(values_list) + ';\n'
+            values_list = []
+            statement_size = prefix_size
+        values_list.append(value)
+        statement_size += value_size
+    if values_list:
+        yield insert_statement_prefix + ',\n'.join(values_list) + ';\n'
+
+
 def _generate_backup_header() -> str:
     return """
 /*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;
@@ -68,100 +151,227 @@ class MySQLBackup:
         self.user = user
         self.password = password
         self.db_name = db_name
+        self.conn = self._connect(client_flag=CLIENT.MULTI_STATEMENTS)
+        self.cursor = self.conn.cursor()
+
+    def _connect(self, client_flag: int = 0) -> pymysql.connections.Connection:
+        """
+        Open a new connection to the database.
+
+        Args:
+            client_flag (int): Extra pymysql client capability flags.
+
+        Raises:
+            DatabaseConnectionError: If there's an error connecting to the database.
+        """
         try:
-            self.conn = pymysql.connect(host=host, user=user, password=password, database=db_name)
+            return pymysql.connect(host=self.host, user=self.user, password=self.password, database=self.db_name,
+                                   client_flag=client_flag)
         except pymysql.MySQLError as e:
-            raise DatabaseConnectionError(host, user) from e
-        self.cursor = self.conn.cursor()
+            raise DatabaseConnectionError(self.host, self.user) from e
+
+    def _connect_snapshot_worker(self) -> pymysql.connections.Connection:
+        """
+        Open a worker connection and start a transaction on a consistent snapshot of the database.
+
+        Raises:
+            DatabaseConnectionError: If there's an error connecting to the database.
+        """
+        conn = self._connect()
+        with conn.cursor() as cursor:
+            cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        return conn
+
+    def _open_snapshot_pool(self, size: int) -> Queue:
+        """
+        Open `size` worker connections that all read the same snapshot of the database.
+
+        As in mysqldump, writes are blocked by a global read lock while the workers start their transactions,
+        which needs the RELOAD privilege.
+        """
+        self.cursor.execute("FLUSH TABLES WITH READ LOCK")
+        try:
+            return open_connection_pool(self._connect_snapshot_worker, size)
+        finally:
+            self.cursor.execute("UNLOCK TABLES")
+
+    def _get_create_statements(self, tables: List[str]) -> Dict[str, str]:
+        """
+        Retrieve the CREATE statements of tables and views, batching several
+        SHOW CREATE TABLE statements into each round-trip.
+
+        Args:
+            tables (List[str]): The names of the tables and views.
+
+        Returns:
+            Dict[str, str]: The CREATE statement of each table or view, keyed by name.
+        """
+        create_statements = {}
+        for start in range(0, len(tables), SHOW_CREATE_BATCH_SIZE):
+            batch = tables[start:start + SHOW_CREATE_BATCH_SIZE]
+            self.cursor.execute(''.join(f"SHOW CREATE TABLE {_quote_identifier(table)};" for table in batch))
+            for index, table in enumerate(batch):
+                if index:
+                    self.cursor.nextset()
+                create_statements[table] = self.cursor.fetchone()[1]
+        return create_statements
 
     def backup(self, backup_type: str, tables: Optional[List[str]] = None,
-               include_permissions: bool = False) -> Dict[str, List[str]]:
+               include_permissions: bool = False, jobs: int = 1) -> Iterator[Tuple[str, str, str]]:
         """
         Perform the backup for the specified tables and backup type.
 
+        The backup is streamed in chunks of at most one INSERT statement; with more than one job,
+        the backup of a table is built in memory by its worker before it is yielded, and the workers
+        read the tables from one snapshot, see _open_snapshot_pool.
+
         Args:
             backup_type (str): Type of backup to perform. Options: 'structure', 'data', 'structure_data'.
             tables (Optional[List[str]]): List of tables to include in the backup. If None, all tables are included.
             include_permissions (bool): Whether to include table permissions in the backup.
+            jobs (int): Number of tables backed up concurrently, each worker on its own connection.
 
-        Returns:
-            Dict[str, List[str]]: The backup data organized by table name.
+        Yields:
+            Tuple[str, str, str]: The table name, the section kind ('header', 'structure', 'view', 'data',
+            'permissions' or 'footer') and a chunk of the section's SQL text, one table after another.
 
         Raises:
             BackupError: If there's an error during the backup process.
         """
+        completed = False
         try:
-            backup_data = {}
             header_written = False
 
             if tables is None:
                 self.cursor.execute(
-                    f"SELECT table_name, table_type FROM information_schema.tables "
-                    f"WHERE table_schema='{self.db_name}'")
+                    "SELECT table_name, table_type FROM information_schema.tables "
+                    "WHERE table_schema=%s",
+                    (self.db_name,))
                 all_tables = self.cursor.fetchall()
             else:
                 self.cursor.execute(
-                    f"SELECT table_name, table_type FROM information_schema.tables"
-                    f" WHERE table_schema='{self.db_name}' AND table_name "
+                    "SELECT table_name, table_type FROM information_schema.tables"
+                    " WHERE table_schema=%s AND table_name "
                     f"IN ({','.join(['%s'] * len(tables))})",
-                    tables)
+                    (self.db_name, *tables))
                 all_tables = self.cursor.fetchall()
 
-            for table, table_type in tqdm(all_tables, desc="Backing up tables and views", unit="object"):
-                table_backup_data = []
-
-                if not header_written:
-                    table_backup_data.append(_generate_backup_header())
-                    header_written = True
-
-                if backup_type == 'structure' or backup_type == 'structure_data':
-                    self.cursor.execute(f"SHOW CREATE TABLE `{table}`")
-                    create_table_statement = self.cursor.fetchone()[1]
-                    if table_type == 'VIEW':
-                        table_backup_data.append(
-                            f"-- Structure for view `{table}`\nDROP VIEW IF EXISTS `"
-                            f"{table}`;\n{create_table_statement};\n\n")
-                    else:
-                        table_backup_data.append(
-                            f"-- Table structure for table `{table}`\nDROP TABLE IF EXISTS `"
-                            f"{table}`;\n{create_table_statement};\n\n")
-
-                if table_type == 'BASE TABLE' and (backup_type == 'data' or backup_type == 'structure_data'):
-                    self.cursor.execute(f"SELECT * FROM `{table}`")
-                    rows = self.cursor.fetchall()
-                    if rows:
-                        column_names = [desc[0] for desc in self.cursor.description]
-                        insert_statement_prefix = (f"INSERT INTO `{table}` "
-                                                   f"(`{'`, `'.join(column_names)}`) VALUES ")
-                        values_list = []
-                        for row in rows:
-                            formatted_values = tuple(_format_value(value) for value in row)
-                            values_list.append(f"({', '.join(formatted_values)})")
-                        insert_statement = insert_statement_prefix + ',\n'.join(values_list) + ';\n'
-                        lock_tables = f"LOCK TABLES `{table}` WRITE;\n"
-                        unlock_tables = f"UNLOCK TABLES;\n"
-                        table_backup_data.append(
-                            f"-- Data for table `{table}`\n" + lock_tables + insert_statement + unlock_tables + '\n\n')
-
-                backup_data[table] = table_backup_data
+            if backup_type == 'structure' or backup_type == 'structure_data':
+                create_statements = self._get_create_statements([table for table, _ in all_tables])
+            else:
+                create_statements = {}
+
+            with ExitStack() as stack:
+                if jobs > 1:
+                    pool = self._open_snapshot_pool(min(jobs, len(all_tables)))
+                    stack.callback(close_connection_pool, pool)
+
+                    def backup_table(table_info: Tuple[str, str]) -> List[Tuple[str, str]]:
+                        conn = pool.get()
+                        try:
+                            return list(self._backup_table(conn, *table_info, backup_type,
+                                                           create_statements.get(table_info[0])))
+                        finally:
+                            pool.put(conn)
+
+                    # Results come in table order, whichever worker finishes first; only `jobs` tables are
+                    # submitted ahead of the one being written, so finished tables cannot pile up in memory
+                    executor = stack.enter_context(ThreadPoolExecutor(max_workers=jobs))
+                    all_sections = map_bounded(executor, backup_table, all_tables, jobs)
+                else:
+                    all_sections = (self._backup_table(self.conn, table, table_type, backup_type,
+                                                       create_statements.get(table))
+                                    for table, table_type in all_tables)
+
+                progress = tqdm(zip(all_tables, all_sections), total=len(all_tables),
+                                desc="Backing up tables and views", unit="object",
+                                miniters=max(1, len(all_tables) // 100), mininterval=0.5)
+                for (table, _), sections in progress:
+                    if not header_written:
+                        yield table, 'header', _generate_backup_header()
+                        header_written = True
+
+                    for kind, chunk in sections:
+                        yield table, kind, chunk
 
             if include_permissions is True:
                 self.cursor.execute(f"SHOW GRANTS FOR CURRENT_USER")
                 grants = self.cursor.fetchall()
                 grant_statements = "\n".join([grant[0] for grant in grants])
-                backup_data['permissions'] = [f"-- Permissions\n{grant_statements}\n\n"]
+                yield 'permissions', 'permissions', f"-- Permissions\n{grant_statements}\n\n"
 
             if header_written:
-                backup_data['footer'] = [_generate_backup_footer()]
-
-            self._close_connection()
-            return backup_data
+                yield 'footer', 'footer', _generate_backup_footer()
+            completed = True
         except pymysql.MySQLError as e:
             raise BackupError(f"Error during backup: {str(e)}") from e
+        finally:
+            # End the read transaction, whose snapshot later backups on this connection would otherwise reuse;
+            # it is rolled back if the backup failed or the consumer stopped early (GeneratorExit)
+            if completed:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+
+    @staticmethod
+    def _backup_table(conn: pymysql.connections.Connection, table: str, table_type: str,
+                      backup_type: str, create_table_statement: Optional[str]) -> Iterator[Tuple[str, str]]:
+        """
+        Back up the structure and/or data of a single table or view.
+
+        The data is read and yielded one INSERT statement at a time, so the table is never held in memory.
+
+        Args:
+            conn (pymysql.connections.Connection): The connection to read the table through.
+            table (str): The name of the table or view.
+            table_type (str): The table type from information_schema, e.g. 'BASE TABLE' or 'VIEW'.
+            backup_type (str): Type of backup to perform. Options: 'structure', 'data', 'structure_data'.
+            create_table_statement (Optional[str]): The prefetched CREATE statement of the table or view.
 
-    def _close_connection(self) -> None:
+        Yields:
+            Tuple[str, str]: The section kind ('structure', 'view' or 'data') and a chunk of its SQL text.
+        """
+        # The main connection accepts several statements per query, so every name in SQL must be quoted
+        quoted_table = _quote_identifier(table)
+
+        if backup_type == 'structure' or backup_type == 'structure_data':
+            if table_type == 'VIEW':
+                yield 'view', (f"-- Structure for view {quoted_table}\nDROP VIEW IF EXISTS "
+                               f"{quoted_table};\n{create_table_statement};\n\n")
+            else:
+                yield 'structure', (f"-- Table structure for table {quoted_table}\nDROP TABLE IF EXISTS "
+                                    f"{quoted_table};\n{create_table_statement};\n\n")
+
+        if table_type == 'BASE TABLE' and (backup_type == 'data' or backup_type == 'structure_data'):
+            # Unbuffered cursor: rows are streamed in batches and split into bounded INSERT statements
+            with conn.cursor(SSCursor) as data_cursor:
+                data_cursor.execute(f"SELECT * FROM {quoted_table}")
+                column_names = [desc[0] for desc in data_cursor.description]
+                formatters = [_pick_formatter(desc[1]) for desc in data_cursor.description]
+                insert_statement_prefix = (f"INSERT INTO {quoted_table} "
+                                           f"({', '.join(map(_quote_identifier, column_names))}) VALUES ")
+                values = ("(" + ", ".join([fmt(value) for fmt, value in zip(formatters, row)]) + ")"
+                          for row in _iter_rows(data_cursor))
+                insert_statements = _chunk_insert_statements(insert_statement_prefix, values)
+                # The section is left out for empty tables
+                first_statement = next(insert_statements, None)
+                if first_statement is not None:
+                    yield 'data', (f"-- Data for table {quoted_table}\nLOCK TABLES {quoted_table} WRITE;\n"
+                                   + first_statement)
+                    for insert_statement in insert_statements:
+                        yield 'data', insert_statement
+                    yield 'data', "UNLOCK TABLES;\n\n\n"
+
+    def close(self) -> None:
         """
         Close the database connection.
         """
         self.cursor.close()
         self.conn.close()
+
+    def __enter__(self) -> 'MySQLBackup':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
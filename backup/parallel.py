@@ -0,0 +1,69 @@
+from collections import deque
+from concurrent.futures import Executor
+from queue import Queue
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def map_bounded(executor: Executor, function: Callable[[T], R], items: Iterable[T], window: int) -> Iterator[R]:
+    """
+    Like executor.map(), but keep at most `window` calls submitted ahead of the result being consumed.
+
+    executor.map() submits every call up front, so the results of fast calls pile up in memory behind
+    a slow one; here a new call is only submitted once the oldest result has been taken.
+
+    Args:
+        executor (Executor): The executor running the calls.
+        function (Callable[[T], R]): The function to call on each item.
+        items (Iterable[T]): The items, in order.
+        window (int): Maximum number of calls submitted but not yet consumed.
+
+    Yields:
+        R: The results, in the order of the items.
+    """
+    pending = deque()
+    try:
+        for item in items:
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(executor.submit(function, item))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Calls that have not started yet are dropped when the consumer stops early
+        for future in pending:
+            future.cancel()
+
+
+def open_connection_pool(connect: Callable[[], Any], size: int) -> Queue:
+    """
+    Open `size` connections for worker threads, handed out through a queue.
+
+    Args:
+        connect (Callable[[], Any]): Opens a connection, ready for the workers to use.
+        size (int): Number of connections.
+
+    Returns:
+        Queue: The connections. If one fails to open, those already opened are closed.
+    """
+    pool = Queue()
+    try:
+        for _ in range(size):
+            pool.put(connect())
+    except BaseException:
+        close_connection_pool(pool)
+        raise
+    return pool
+
+
+def close_connection_pool(pool: Queue) -> None:
+    """
+    Close every connection left in the pool.
+
+    Args:
+        pool (Queue): The connections, as returned by open_connection_pool.
+    """
+    while not pool.empty():
+        pool.get_nowait().close()
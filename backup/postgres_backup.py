@@ -1,8 +1,21 @@
 import psycopg2
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
+from decimal import Decimal
+from functools import lru_cache
+from queue import Queue
+from threading import Thread
 from tqdm import tqdm
-from typing import List, Dict, Optional
+from backup.parallel import close_connection_pool, map_bounded, open_connection_pool
+from typing import Callable, List, Dict, Iterator, Optional, Tuple
+
+# Number of rows fetched from the server (and written per INSERT statement) at a time
+FETCH_BATCH_SIZE = 10000
+# Size in characters of the chunks in which COPY output is handed from the reading thread to the backup
+COPY_CHUNK_SIZE = 1 << 20
+# Number of COPY output chunks that may wait in the queue for the backup to take them
+COPY_QUEUE_SIZE = 4
 
 
 def create_foreign_key_statement(foreign_keys: List[tuple]) -> str:
@@ -27,33 +40,106 @@ def create_permission_statements(table: str, permissions: List[tuple]) -> str:
     return "\n".join(permission_statements)
 
 
+@lru_cache(maxsize=4096)
+def _quote_datetime(value: datetime) -> str:
+    """Quote a timestamp; cached because audit and log tables repeat the same values a lot."""
+    return "'" + value.strftime('%Y-%m-%d %H:%M:%S') + "'"
+
+
+@lru_cache(maxsize=4096)
+def _quote_date(value: date) -> str:
+    """Quote a date; cached because date columns are usually low-cardinality."""
+    return "'" + value.strftime('%Y-%m-%d') + "'"
+
+
+def _quote_text(value: str) -> str:
+    """Quote a string, doubling embedded single quotes."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+# Formatters by exact value type; datetime must stay ahead of date for the isinstance fallback
+_FORMATTERS = {
+    type(None): lambda value: 'NULL',
+    str: _quote_text,
+    int: str,
+    float: str,
+    bool: str,
+    Decimal: str,
+    datetime: _quote_datetime,
+    date: _quote_date,
+    list: lambda value: "'{" + ','.join(value) + "}'",
+    memoryview: lambda value: "'<memory>'",
+}
+
+
 def format_value(value) -> str:
     """Format a value for inclusion in SQL statements."""
-    if value is None:
-        return 'NULL'
-    elif isinstance(value, (datetime, date)):
-        return f"'{value.strftime('%Y-%m-%d')}'" if isinstance(value, date)\
-            else f"'{value.strftime('%Y-%m-%d %H:%M:%S')}'"
-    elif isinstance(value, list):
-        return "'{" + ','.join(value) + "}'"
-    elif isinstance(value, str):
-        return f"'{value.replace('\'', '\'\'')}'"
-    elif isinstance(value, memoryview):
-        return "'<memory>'"
-    else:
-        return str(value)
+    formatter = _FORMATTERS.get(type(value))
+    if formatter is not None:
+        return formatter(value)
+    # Subclasses of the types above
+    for value_type, formatter in _FORMATTERS.items():
+        if isinstance(value, value_type):
+            return formatter(value)
+    return str(value)
+
+
+_NUMERIC_TYPES = frozenset(['smallint', 'integer', 'bigint', 'numeric', 'real', 'double precision'])
+_TEXT_TYPES = frozenset(['text', 'character varying', 'character'])
+_TIMESTAMP_TYPES = frozenset(['timestamp without time zone', 'timestamp with time zone'])
+
+
+def _format_numeric(value) -> str:
+    """Format a value from a numeric column."""
+    return 'NULL' if value is None else str(value)
+
+
+def _format_text(value) -> str:
+    """Format a value from a text column."""
+    return 'NULL' if value is None else _quote_text(value)
+
+
+def _format_timestamp(value) -> str:
+    """Format a value from a timestamp column."""
+    return 'NULL' if value is None else _quote_datetime(value)
+
+
+def _format_date(value) -> str:
+    """Format a value from a date column."""
+    return 'NULL' if value is None else _quote_date(value)
+
+
+def pick_formatter(data_type: str):
+    """Select the value formatter for a column once, based on its declared data type."""
+    if data_type in _NUMERIC_TYPES:
+        return _format_numeric
+    if data_type in _TEXT_TYPES:
+        return _format_text
+    if data_type in _TIMESTAMP_TYPES:
+        return _format_timestamp
+    if data_type == 'date':
+        return _format_date
+    return format_value
+
+
+def create_insert_template(table: str, columns: List[tuple]) -> Tuple[str, List[Callable]]:
+    """Build the INSERT prefix and the per-column value formatters for a table, reusable across row batches."""
+    col_names = [col[0] for col in columns]
+    insert_prefix = f"INSERT INTO public.{table} ({', '.join(col_names)}) VALUES \n"
+    return insert_prefix, [pick_formatter(col[1]) for col in columns]
+
+
+def format_insert_statement(insert_prefix: str, formatters: List[Callable], rows: List[tuple]) -> str:
+    """Create an SQL insert statement for a batch of rows from a prebuilt INSERT template."""
+    values_str = ',\n'.join(['(' + ', '.join([fmt(value) for fmt, value in zip(formatters, row)]) + ')'
+                             for row in rows])
+    return insert_prefix + values_str + ';'
 
 
 def create_insert_statement(table: str, columns: List[tuple], rows: List[tuple]) -> str:
     """Create SQL insert statements for table data."""
-    col_names = [col[0] for col in columns]
-    values_list = []
-    for row in rows:
-        formatted_values = ', '.join([format_value(value) for value in row])
-        values_list.append(f"({formatted_values})")
-    values_str = ',\n'.join(values_list)
-    insert_statement = f"INSERT INTO public.{table} ({', '.join(col_names)}) VALUES \n{values_str};"
-    return insert_statement
+    insert_prefix, formatters = create_insert_template(table, columns)
+    return format_insert_statement(insert_prefix, formatters, rows)
 
 
 def create_type_statement(type_name: str, labels: List[str]) -> str:
@@ -65,6 +151,30 @@ def create_type_statement(type_name: str, labels: List[str]) -> str:
     return drop_type_stmt + create_type_stmt
 
 
+class _ChunkWriter:
+    """File-like object for copy_expert() that puts what is written into a queue, in chunks of COPY_CHUNK_SIZE."""
+
+    def __init__(self, chunks: Queue):
+        self.chunks = chunks
+        self.parts = []
+        self.size = 0
+
+    def write(self, data: str) -> int:
+        """Collect data, putting it into the queue once a chunk is full; blocks while the queue is full."""
+        self.parts.append(data)
+        self.size += len(data)
+        if self.size >= COPY_CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self) -> None:
+        """Put the collected data into the queue."""
+        if self.parts:
+            self.chunks.put(''.join(self.parts))
+            self.parts = []
+            self.size = 0
+
+
 class PostgresBackup:
     def __init__(self, host: str, user: str, password: str, db_name: str):
         """
@@ -80,40 +190,84 @@ class PostgresBackup:
         self.user = user
         self.password = password
         self.db_name = db_name
-        self.conn = psycopg2.connect(host=self.host, user=self.user, password=self.password, dbname=self.db_name)
+        self.conn = self._connect()
         self.cursor = self.conn.cursor()
 
-    def get_table_definitions(self, table: str) -> List[tuple]:
-        """Retrieve table definitions (column names, data types, etc.)."""
-        self.cursor.execute("""
-            SELECT column_name, data_type, is_nullable, column_default
-            FROM information_schema.columns
-            WHERE table_name = %s
-            ORDER BY ordinal_position;
-        """, (table,))
-        return self.cursor.fetchall()
+    def _connect(self):
+        """Open a new connection to the database."""
+        return psycopg2.connect(host=self.host, user=self.user, password=self.password, dbname=self.db_name)
+
+    def _open_snapshot_pool(self, size: int) -> Queue:
+        """Open `size` worker connections whose transactions read the snapshot of the backup's transaction."""
+        self.cursor.execute("SELECT pg_export_snapshot();")
+        snapshot = self.cursor.fetchone()[0]
+
+        def connect():
+            conn = self._connect()
+            with conn.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+                cursor.execute("SET TRANSACTION SNAPSHOT %s;", (snapshot,))
+            return conn
+
+        return open_connection_pool(connect, size)
+
+    def _iter_table_data(self, conn, table: str, columns: List[tuple]) -> Iterator[str]:
+        """Yield INSERT statements for the rows of a table, read through a server-side cursor on `conn`."""
+        insert_prefix, formatters = create_insert_template(table, columns)
+        with conn.cursor(name='backup_cur') as data_cursor:
+            data_cursor.itersize = FETCH_BATCH_SIZE
+            data_cursor.execute(f"SELECT * FROM {table}")
+            while rows := data_cursor.fetchmany(FETCH_BATCH_SIZE):
+                yield format_insert_statement(insert_prefix, formatters, rows)
+                yield "\n"
+
+    @staticmethod
+    def _iter_table_copy(conn, table: str, columns: List[tuple]) -> Iterator[str]:
+        """
+        Yield a COPY ... FROM stdin block with the rows of a table, serialized by the server.
 
-    def get_foreign_keys(self, table: str) -> List[tuple]:
-        """Retrieve foreign keys for a given table."""
-        self.cursor.execute("""
-            SELECT tc.constraint_name, tc.table_name, kcu.column_name, 
-                   ccu.table_name AS foreign_table_name,
-                   ccu.column_name AS foreign_column_name 
-            FROM information_schema.table_constraints AS tc 
-                JOIN information_schema.key_column_usage AS kcu
-                  ON tc.constraint_name = kcu.constraint_name
-                JOIN information_schema.constraint_column_usage AS ccu
-                  ON ccu.constraint_name = tc.constraint_name
-            WHERE constraint_type = 'FOREIGN KEY' AND tc.table_name = %s;
-        """, (table,))
-        return self.cursor.fetchall()
+        copy_expert() runs in a helper thread and hands its output over in chunks through a bounded queue,
+        so at most COPY_QUEUE_SIZE chunks of a table are held in memory.
+        """
+        col_names = ', '.join(col[0] for col in columns)
+        chunks = Queue(maxsize=COPY_QUEUE_SIZE)
+
+        def copy_out() -> None:
+            # Ends with None, or with the exception raised by the COPY
+            try:
+                writer = _ChunkWriter(chunks)
+                with conn.cursor() as cursor:
+                    cursor.copy_expert(f"COPY public.{table} ({col_names}) TO STDOUT", writer)
+                writer.flush()
+                chunks.put(None)
+            except Exception as e:
+                chunks.put(e)
+
+        yield f"COPY public.{table} ({col_names}) FROM stdin;\n"
+        thread = Thread(target=copy_out, daemon=True)
+        thread.start()
+        chunk = ''
+        try:
+            while (chunk := chunks.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            if not (chunk is None or isinstance(chunk, Exception)):
+                # The consumer stopped early: cancel the COPY and take what the thread still puts in the queue,
+                # so that it can finish
+                conn.cancel()
+                while not (chunk is None or isinstance(chunk, Exception)):
+                    chunk = chunks.get()
+            thread.join()
+        yield "\\.\n\n"
 
     def get_primary_keys(self, table: str) -> List[str]:
         """Retrieve primary keys for a given table."""
         self.cursor.execute("""
             SELECT kcu.column_name
             FROM information_schema.table_constraints tco
-            JOIN information_schema.key_column_usage kcu 
+            JOIN information_schema.key_column_usage kcu
                 ON kcu.constraint_name = tco.constraint_name
             WHERE tco.constraint_type = 'PRIMARY KEY'
               AND kcu.table_name = %s
@@ -121,23 +275,18 @@ class PostgresBackup:
         """, (table,))
         return [row[0] for row in self.cursor.fetchall()]
 
-    def get_sequences(self) -> List[str]:
-        """Retrieve all sequences in the public schema."""
+    def get_sequences(self) -> Dict[str, tuple]:
+        """Retrieve the settings of all sequences in the public schema, keyed by sequence name."""
         self.cursor.execute("""
-            SELECT sequence_name
-            FROM information_schema.sequences
-            WHERE sequence_schema = 'public';
+            SELECT sequencename, start_value, increment_by, min_value, max_value, cache_size
+            FROM pg_sequences
+            WHERE schemaname = 'public';
         """)
-        return [seq[0] for seq in self.cursor.fetchall()]
+        return {sequence: tuple(seq_info) for sequence, *seq_info in self.cursor.fetchall()}
 
-    def create_sequence_statement(self, sequence: str) -> str:
-        """Create SQL statement for recreating a sequence."""
-        self.cursor.execute(f"""
-            SELECT start_value, increment_by, min_value, max_value, cache_size
-            FROM pg_sequences
-            WHERE schemaname = 'public' AND sequencename = %s;
-        """, (sequence,))
-        seq_info = self.cursor.fetchone()
+    @staticmethod
+    def create_sequence_statement(sequence: str, seq_info: tuple) -> str:
+        """Create SQL statement for recreating a sequence from its settings."""
         start_value, increment_by, min_value, max_value, cache_size = seq_info
 
         drop_sequence_stmt = f"DROP SEQUENCE IF EXISTS public.{sequence} CASCADE;\n"
@@ -149,11 +298,13 @@ class PostgresBackup:
         create_sequence_stmt += f"    CACHE {cache_size};\n"
         return drop_sequence_stmt + create_sequence_stmt
 
-    def create_table_statement(self, table: str, columns: List[tuple]) -> str:
+    def create_table_statement(self, table: str, columns: List[tuple],
+                               primary_keys: Optional[List[str]] = None) -> str:
         create_table_stmt = f"DROP TABLE IF EXISTS public.{table} CASCADE;\n"
         create_table_stmt += f"CREATE TABLE public.{table} (\n"
         col_defs = []
-        primary_keys = self.get_primary_keys(table)
+        if primary_keys is None:
+            primary_keys = self.get_primary_keys(table)
         for col in columns:
             col_name, data_type, is_nullable, col_default = col
             if data_type == 'USER-DEFINED':
@@ -192,30 +343,102 @@ class PostgresBackup:
             types[type_name].append(enum_label)
         return types
 
-    def get_table_permissions(self, table: str) -> List[tuple]:
-        """Retrieve table permissions for a given table."""
+    def get_all_table_definitions(self) -> Dict[str, List[tuple]]:
+        """Retrieve column definitions for every table in the public schema, keyed by table name."""
+        self.cursor.execute("""
+            SELECT table_name, column_name, data_type, is_nullable, column_default
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+            ORDER BY table_name, ordinal_position;
+        """)
+        definitions = defaultdict(list)
+        for table_name, *column in self.cursor.fetchall():
+            definitions[table_name].append(tuple(column))
+        return definitions
+
+    def get_all_foreign_keys(self) -> Dict[str, List[tuple]]:
+        """Retrieve foreign keys for every table in the public schema, keyed by table name."""
+        self.cursor.execute("""
+            SELECT tc.constraint_name, tc.table_name, kcu.column_name,
+                   ccu.table_name AS foreign_table_name,
+                   ccu.column_name AS foreign_column_name
+            FROM information_schema.table_constraints AS tc
+                JOIN information_schema.key_column_usage AS kcu
+                  ON tc.constraint_name = kcu.constraint_name
+                JOIN information_schema.constraint_column_usage AS ccu
+                  ON ccu.constraint_name = tc.constraint_name
+            WHERE constraint_type = 'FOREIGN KEY' AND tc.table_schema = 'public';
+        """)
+        foreign_keys = defaultdict(list)
+        for fk in self.cursor.fetchall():
+            foreign_keys[fk[1]].append(fk)
+        return foreign_keys
+
+    def get_all_primary_keys(self) -> Dict[str, List[str]]:
+        """Retrieve primary key columns for every table in the public schema, keyed by table name."""
         self.cursor.execute("""
-              SELECT grantee, privilege_type
-              FROM information_schema.role_table_grants
-              WHERE table_name = %s;
-          """, (table,))
-        return self.cursor.fetchall()
+            SELECT kcu.table_name, kcu.column_name
+            FROM information_schema.table_constraints tco
+            JOIN information_schema.key_column_usage kcu
+                ON kcu.constraint_name = tco.constraint_name
+            WHERE tco.constraint_type = 'PRIMARY KEY'
+              AND kcu.table_schema = 'public'
+            ORDER BY kcu.table_name, kcu.ordinal_position;
+        """)
+        primary_keys = defaultdict(list)
+        for table_name, column_name in self.cursor.fetchall():
+            primary_keys[table_name].append(column_name)
+        return primary_keys
+
+    def get_all_table_permissions(self) -> Dict[str, List[tuple]]:
+        """Retrieve table permissions for every table in the public schema, keyed by table name."""
+        self.cursor.execute("""
+            SELECT table_name, grantee, privilege_type
+            FROM information_schema.role_table_grants
+            WHERE table_schema = 'public';
+        """)
+        permissions = defaultdict(list)
+        for table_name, grantee, privilege_type in self.cursor.fetchall():
+            permissions[table_name].append((grantee, privilege_type))
+        return permissions
 
     def backup(self, backup_type: str, tables: Optional[List[str]] = None,
-               include_permissions: bool = False) -> str:
+               include_permissions: bool = False, jobs: int = 1, use_copy: bool = False) -> Iterator[str]:
         """
         Perform the backup of the specified tables.
 
+        The backup runs in a transaction of the kept connection, which ends with the backup: it is committed
+        once the backup completes, and rolled back if the backup fails or the consumer stops early.
+
         Args:
             backup_type (str): Type of backup to perform. Options: 'structure', 'data', 'structure_data'.
             tables (Optional[List[str]]): List of tables to include in the backup. If None, all tables are included.
             include_permissions (bool): Whether to include table permissions in the backup.
-
-        Returns:
-            str: The SQL backup script.
+            jobs (int): Number of tables whose data is dumped concurrently, each worker on its own connection
+                reading the snapshot of the backup's transaction. With more than one job, the data of a table
+                is built in memory before it is yielded.
+            use_copy (bool): Whether to dump table data as COPY blocks produced by the server
+                instead of INSERT statements formatted in Python.
+
+        Yields:
+            str: Consecutive chunks of the SQL backup script.
         """
+        completed = False
+        try:
+            yield from self._iter_backup(backup_type, tables, include_permissions, jobs, use_copy)
+            completed = True
+        finally:
+            # An aborted transaction would fail every later backup on the connection, and an open one holds locks
+            if completed:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+
+    def _iter_backup(self, backup_type: str, tables: Optional[List[str]], include_permissions: bool, jobs: int,
+                     use_copy: bool) -> Iterator[str]:
+        """Yield the chunks of the SQL backup script; see backup() for the arguments."""
         # SQL setup script
-        backup_sql = """\
+        yield """\
 SET statement_timeout = 0;
 SET lock_timeout = 0;
 SET idle_in_transaction_session_timeout = 0;
@@ -241,14 +464,24 @@ SET row_security = off;
             all_tables = tables
             include_sequences_and_types = False
 
+        # Retrieve sequences and user-defined types if including all tables
+        sequences = self.get_sequences() if include_sequences_and_types else {}
+        user_defined_types = self.get_user_defined_types() if include_sequences_and_types else {}
+
         # Total steps for progress bar
         total_steps = len(all_tables) + len(all_tables)
         if include_sequences_and_types:
-            total_steps += (len(all_tables) + len(self.get_sequences()) +
-                            len(self.get_user_defined_types().items()))
+            total_steps += len(all_tables) + len(sequences) + len(user_defined_types)
 
-        # Create a progress bar
-        pbar = tqdm(total=total_steps, desc="Backing up database")
+        # Create a progress bar; redraws are throttled since steps can number in the tens of thousands
+        pbar = tqdm(total=total_steps, desc="Backing up database",
+                    miniters=max(1, total_steps // 100), mininterval=0.5)
+
+        # Catalog metadata is fetched once for the whole schema and looked up per table
+        all_definitions = self.get_all_table_definitions()
+        all_foreign_keys = self.get_all_foreign_keys()
+        all_primary_keys = self.get_all_primary_keys() if backup_type in ['structure', 'structure_data'] else {}
+        all_permissions = self.get_all_table_permissions() if include_permissions else {}
 
         # Dictionaries to hold table definitions and dependencies
         table_definitions = {}
@@ -256,25 +489,16 @@ SET row_security = off;
 
         # Get table definitions and dependencies
         for table in all_tables:
-            columns = self.get_table_definitions(table)
+            columns = all_definitions[table]
             table_definitions[table] = columns
 
             # Get foreign keys for the table
-            foreign_keys = self.get_foreign_keys(table)
+            foreign_keys = all_foreign_keys[table]
             for fk in foreign_keys:
                 dependency_map[table].append(fk[3])  # Add tables referenced by foreign key
+        pbar.update(len(all_tables))  # Update progress bar
 
-            pbar.update(1)  # Update progress bar
-
-        # Retrieve sequences and user-defined types if including all tables
-        if include_sequences_and_types:
-            sequences = self.get_sequences()
-            user_defined_types = self.get_user_defined_types()
-            pbar.update(len(sequences))  # Update progress bar
-            pbar.update(len(user_defined_types))  # Update progress bar
-        else:
-            sequences = []
-            user_defined_types = {}
+        pbar.update(len(sequences) + len(user_defined_types))  # Update progress bar
 
         # Order of table creation (simply based on their retrieval order)
         sorted_tables = all_tables
@@ -284,62 +508,79 @@ SET row_security = off;
         # Generate SQL for creating user-defined types if backing up structure and all tables
         if backup_type in ['structure', 'structure_data'] and include_sequences_and_types:
             for type_name, labels in user_defined_types.items():
-                backup_sql += create_type_statement(type_name, labels) + "\n"
-                pbar.update(1)  # Update progress bar
+                yield create_type_statement(type_name, labels)
+                yield "\n"
+            pbar.update(len(user_defined_types))  # Update progress bar
 
         # Generate SQL for creating sequences if backing up structure and all tables
         if backup_type in ['structure', 'structure_data'] and include_sequences_and_types:
-            for sequence in sequences:
-                backup_sql += self.create_sequence_statement(sequence) + "\n"
+            for sequence, seq_info in sequences.items():
+                yield self.create_sequence_statement(sequence, seq_info)
+                yield "\n"
                 pbar.update(1)  # Update progress bar
 
         # Generate SQL for creating tables if backing up structure
         if backup_type in ['structure', 'structure_data']:
             for table in sorted_tables:
                 columns = table_definitions[table]
-                backup_sql += self.create_table_statement(table, columns) + "\n"
+                yield self.create_table_statement(table, columns, all_primary_keys[table])
+                yield "\n"
 
                 # Add foreign keys after table creation
-                foreign_keys = self.get_foreign_keys(table)
+                foreign_keys = all_foreign_keys[table]
                 foreign_keys_to_add.append((table, foreign_keys))
-
-                pbar.update(1)  # Update progress bar
+            pbar.update(len(sorted_tables))  # Update progress bar
 
         # Generate SQL for table data if backing up data
-        if backup_type in ['data', 'structure_data']:
+        iter_table_data = self._iter_table_copy if use_copy else self._iter_table_data
+        if backup_type in ['data', 'structure_data'] and jobs > 1:
+            pool = self._open_snapshot_pool(min(jobs, len(sorted_tables)))
+
+            def dump_table(table: str) -> str:
+                conn = pool.get()
+                try:
+                    return ''.join(iter_table_data(conn, table, table_definitions[table]))
+                finally:
+                    pool.put(conn)
+
+            try:
+                # Results come in table order, whichever worker finishes first; only `jobs` tables are
+                # submitted ahead of the one being written, so finished tables cannot pile up in memory
+                with ThreadPoolExecutor(max_workers=jobs) as executor:
+                    for table_data in map_bounded(executor, dump_table, sorted_tables, jobs):
+                        yield table_data
+                        pbar.update(1)  # Update progress bar
+            finally:
+                close_connection_pool(pool)
+        elif backup_type in ['data', 'structure_data']:
             for table in sorted_tables:
-                self.cursor.execute(f"SELECT * FROM {table};")
-                rows = self.cursor.fetchall()
-
-                self.cursor.execute(f"""
-                    SELECT column_name, data_type
-                    FROM information_schema.columns
-                    WHERE table_name = %s
-                    ORDER BY ordinal_position;
-                """, (table,))
-                columns = self.cursor.fetchall()
-
-                if rows:
-                    backup_sql += create_insert_statement(table, columns, rows) + "\n"
-
+                yield from iter_table_data(self.conn, table, table_definitions[table])
                 pbar.update(1)  # Update progress bar
 
         # Generate SQL for adding foreign keys if backing up structure
         if backup_type in ['structure', 'structure_data']:
             for table, foreign_keys in foreign_keys_to_add:
                 if foreign_keys:
-                    backup_sql += create_foreign_key_statement(foreign_keys) + "\n"
-                pbar.update(1)  # Update progress bar
+                    yield create_foreign_key_statement(foreign_keys)
+                    yield "\n"
+            pbar.update(len(foreign_keys_to_add))  # Update progress bar
 
         if include_permissions:
             for table in sorted_tables:
-                permissions = self.get_table_permissions(table)
+                permissions = all_permissions[table]
                 if permissions:
-                    backup_sql += create_permission_statements(table, permissions) + "\n"
-        # Close the cursor and connection
+                    yield create_permission_statements(table, permissions)
+                    yield "\n"
+
+        pbar.close()  # Close progress bar
+
+    def close(self) -> None:
+        """Close the cursor and the database connection."""
         self.cursor.close()
         self.conn.close()
 
-        pbar.close()  # Close progress bar
+    def __enter__(self) -> 'PostgresBackup':
+        return self
 
-        return backup_sql
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
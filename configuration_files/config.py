@@ -1,11 +1,14 @@
 import configparser
-import glob
+import os
+from functools import lru_cache
 from configuration_files.exceptions import ConfigError
 
 
-def read_config(config_path: str) -> dict:
+@lru_cache(maxsize=32)
+def _read_config_cached(config_path: str, mtime_ns: int) -> dict:
     """
-    Read the configuration file and return a dictionary with database connection parameters.
+    Parse the configuration file. Results are cached per absolute path and modification time,
+    so an edited file is parsed again.
     """
     try:
         config = configparser.ConfigParser()
@@ -24,10 +27,23 @@ def read_config(config_path: str) -> dict:
         raise ConfigError(f"No sections found in config file: {config_path}") from e
 
 
+def read_config(config_path: str) -> dict:
+    """
+    Read the configuration file and return a dictionary with database connection parameters.
+    """
+    try:
+        mtime_ns = os.stat(config_path).st_mtime_ns
+    except OSError as e:
+        raise ConfigError(f"Error reading config file: {config_path}") from e
+    return dict(_read_config_cached(os.path.abspath(config_path), mtime_ns))
+
+
 def list_config_files() -> None:
     """
     List all configuration files with the .cfg extension in the current directory.
     """
-    config_files = glob.glob('*.cfg')
-    for config_file in config_files:
-        print(config_file)
+    # scandir reports the entry type from the directory listing itself; hidden files are skipped like glob does
+    with os.scandir('.') as entries:
+        for entry in entries:
+            if entry.name.endswith('.cfg') and not entry.name.startswith('.') and entry.is_file():
+                print(entry.name)
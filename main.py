@@ -1,11 +1,15 @@
 import argparse
+from functools import cache
 from restore.restore_data import restore_data
 from configuration_files.config import read_config, list_config_files
 from backup.backup_manager import BackupManager
 from configuration_files.exceptions import ConfigError, BackupManagerError
+from typing import List, Optional
 
 
-def main() -> None:
+@cache
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser once; repeated main() calls in the same process reuse it."""
     parser = argparse.ArgumentParser(description='Database backup and restore utility')
 
     config_group = parser.add_argument_group('Configuration')
@@ -29,12 +33,21 @@ def main() -> None:
     backup_group.add_argument('-o', '--output_file', help='Do backup in a single file')
     backup_group.add_argument('-t', '--tables', nargs='+', help='List of tables to backup')
     backup_group.add_argument('-v', '--version', help='Versioning of database')
+    backup_group.add_argument('-j', '--jobs', type=int, default=1,
+                              help='Number of tables to back up or restore in parallel')
+    backup_group.add_argument('--copy', action='store_true',
+                              help='Dump PostgreSQL table data with COPY instead of INSERT statements')
 
     restore_group = parser.add_argument_group('Restore')
     restore_group.add_argument('--restore', help='Name of the database to restore')
     restore_group.add_argument('-f', '--file_data', help='Path to the backup data file')
+    restore_group.add_argument('--parse-cache', action='store_true',
+                               help='Reuse the parsed statements of an unchanged backup file from ~/.cache/sqlbackup')
+    return parser
 
-    args = parser.parse_args()
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = _build_parser().parse_args(argv)
 
     if args.list_configs:
         list_config_files()
@@ -50,18 +63,19 @@ def main() -> None:
             args.db_type = config['db_type']
 
         if args.restore:
-            restore_data(args.db_type, args.host, args.user, args.password, args.restore, args.file_data)
+            restore_data(args.db_type, args.host, args.user, args.password, args.restore, args.file_data,
+                         args.parse_cache, args.jobs)
 
         if args.backup:
-            backup_manager = BackupManager(args.db_type, args.host, args.user, args.password, args.db_name)
-            backup_data = backup_manager.backup(args.backup, args.tables, args.s)
+            with BackupManager(args.db_type, args.host, args.user, args.password, args.db_name) as backup_manager:
+                backup_data = backup_manager.backup(args.backup, args.tables, args.s, args.jobs, args.copy)
 
-            if args.output_file:
-                backup_manager.save_backup_data(backup_data, args.output_file, args.version, args.db_type)
-            elif args.s:
-                backup_manager.save_multiple_files(backup_data)
-            else:
-                print(backup_data)
+                if args.output_file:
+                    backup_manager.save_backup_data(backup_data, args.output_file, args.version, args.db_type)
+                elif args.s:
+                    backup_manager.save_multiple_files(backup_data)
+                else:
+                    backup_manager.save_backup_data(backup_data, db_type=args.db_type)
     except ConfigError as e:
         print(f"Configuration error: {str(e)}")
     except BackupManagerError as e:
@@ -0,0 +1,279 @@
+import copy
+import re
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from configuration_files.exceptions import RestoreError
+from restore.parallel import load_tables_in_parallel, rank_tables
+from restore.pool import acquire_connection, release_connection
+from restore.sql_parser import data_table, read_statements
+from typing import Any, Callable, Hashable, Iterable, Iterator, List, Optional, Set, Tuple, Type, Union
+
+Command = Union[str, Tuple[str, str]]
+
+# A SET statement, possibly inside a MySQL /*!NNNNN ... */ comment and preceded by comment lines
+_SESSION_SETTING_RE = re.compile(r"(?:\s|--[^\n]*\n)*(?:/\*!\d*\s*)?SET\s", re.IGNORECASE)
+
+
+class BaseBackupRestore(ABC):
+    """
+    Restores a database from an SQL file; subclasses implement the database-specific parts.
+    """
+    # Base class of the driver's exceptions, turned into RestoreError
+    driver_error: Type[Exception] = Exception
+    # Whether a backslash escapes the next character inside quoted strings of the SQL file
+    backslash_escapes = False
+    # Whether the SQL file may contain COPY ... FROM stdin data blocks
+    copy_blocks = False
+
+    def __init__(self, host: str, user: str, password: str, db_name: str) -> None:
+        """
+        Stores the connection parameters; subclasses open the connection.
+
+        Args:
+            host (str): The host address of the database server.
+            user (str): The username for accessing the database server.
+            password (str): The password for accessing the database server.
+            db_name (str): The name of the database to be restored.
+        """
+        self.host = host
+        self.user = user
+        self.password = password
+        self.db_name = db_name
+        # Tables that received data, named as the backend needs them for analyzing them once the restore is
+        # committed; shared with the parallel workers
+        self.loaded_tables: Set[Hashable] = set()
+        self.conn: Any = None
+        self.cursor: Any = None
+
+    @abstractmethod
+    def connect(self) -> Any:
+        """
+        Opens a connection to the target database, with autocommit off.
+
+        Returns:
+            The driver's connection object.
+        """
+
+    @abstractmethod
+    def _is_usable(self, conn: Any) -> bool:
+        """
+        Checks that an idle pooled connection still reaches the server.
+
+        Args:
+            conn: The connection.
+
+        Returns:
+            bool: True if the connection can be reused.
+        """
+
+    def _pool_key(self, db_name: Optional[str] = None) -> Hashable:
+        """
+        Builds the key under which this handler's connections are pooled.
+
+        Args:
+            db_name (Optional[str]): The database the connections are for, if not the one being restored.
+
+        Returns:
+            Hashable: The pool key.
+        """
+        return type(self), self.host, self.user, self.password, self.db_name if db_name is None else db_name
+
+    def _acquire_connection(self, connect: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Takes an idle connection to the target database from the pool, or opens one.
+
+        Args:
+            connect (Optional[Callable[[], Any]]): Opens a new connection; defaults to connect().
+
+        Returns:
+            The driver's connection object.
+        """
+        return acquire_connection(self._pool_key(), connect or self.connect, self._is_usable)
+
+    @abstractmethod
+    def _execute(self, sql_commands: Iterable[Command]) -> None:
+        """
+        Executes SQL commands on this handler's connection without committing.
+
+        Args:
+            sql_commands (Iterable[Command]): SQL commands to execute.
+        """
+
+    @abstractmethod
+    def get_foreign_keys(self) -> List[Tuple[str, str]]:
+        """
+        Lists the foreign keys between tables of the database.
+
+        Returns:
+            List[Tuple[str, str]]: (referencing table, referenced table) pairs.
+        """
+
+    @abstractmethod
+    def analyze_tables(self) -> None:
+        """
+        Refreshes the statistics of the tables that received data.
+        """
+
+    def restore(self, sql_commands: Iterable[Command], jobs: int = 1) -> None:
+        """
+        Executes SQL commands to restore the database as a single transaction, then analyzes the loaded tables.
+
+        With several jobs, the other statements run first and the data of each table is then loaded
+        on one of `jobs` connections, in foreign key order; each table is committed separately.
+
+        Args:
+            sql_commands (Iterable[Command]): SQL commands to execute for restoring the database, consumed lazily.
+            jobs (int): Number of tables to load in parallel.
+
+        Raises:
+            RestoreError: If a command fails or the SQL file is truncated; the current transaction is rolled back
+                in that case.
+        """
+        try:
+            if jobs > 1:
+                self._restore_parallel(sql_commands, jobs)
+            else:
+                self._execute(sql_commands)
+            self.conn.commit()
+            self.analyze_tables()
+        except self.driver_error as e:
+            self.conn.rollback()
+            raise RestoreError(f"An error occurred while restoring the database: {str(e)}") from e
+        except RestoreError:
+            # The SQL file could not be parsed to the end
+            self.conn.rollback()
+            raise
+
+    def _is_session_setting(self, command: str) -> bool:
+        """
+        Tells whether a statement changes a setting of the session, such as the time zone or the SQL mode.
+
+        Args:
+            command (str): A statement that loads no data.
+
+        Returns:
+            bool: True for session settings.
+        """
+        return _SESSION_SETTING_RE.match(command) is not None
+
+    def _skip_in_parallel(self, command: Command) -> bool:
+        """
+        Tells whether a statement must be left out when tables are loaded in parallel.
+
+        Args:
+            command (Command): A statement that loads no data.
+
+        Returns:
+            bool: True to skip the statement.
+        """
+        return False
+
+    def _restore_parallel(self, sql_commands: Iterable[Command], jobs: int) -> None:
+        """
+        Executes the statements that do not load data, then loads the tables on `jobs` connections.
+
+        Args:
+            sql_commands (Iterable[Command]): SQL commands to execute.
+            jobs (int): Number of tables to load in parallel.
+        """
+        table_commands = defaultdict(list)
+        # The session settings in effect where the data starts, such as those of the dump's header; settings
+        # further down, e.g. a footer restoring the previous values, do not apply to the data
+        session_settings = []
+
+        def schema_commands() -> Iterator[Command]:
+            for command in sql_commands:
+                table = data_table(command)
+                if table is not None:
+                    table_commands[table].append(command)
+                elif not self._skip_in_parallel(command):
+                    if not table_commands and self._is_session_setting(command):
+                        session_settings.append(command)
+                    yield command
+
+        self._execute(schema_commands())
+        # The workers only see the tables once they are committed
+        self.conn.commit()
+        if not table_commands:
+            return
+        ranks = rank_tables(table_commands, self.get_foreign_keys())
+        workers = []
+        try:
+            for _ in range(min(jobs, len(table_commands))):
+                workers.append(self._open_worker(session_settings))
+            load_tables_in_parallel(ranks, table_commands, workers, BaseBackupRestore._load_table)
+        finally:
+            for worker in workers:
+                worker.close_connection()
+
+    def _open_worker(self, session_settings: List[Command]) -> 'BaseBackupRestore':
+        """
+        Creates a copy of this handler with its own connection to the database, for loading tables in parallel.
+
+        Args:
+            session_settings (List[Command]): The statements setting up the session for loading the data, which
+                ran on this handler's connection only.
+
+        Returns:
+            BaseBackupRestore: The worker handler.
+        """
+        worker = copy.copy(self)
+        worker.conn = self._acquire_connection()
+        worker.cursor = worker.conn.cursor()
+        try:
+            # Committed, so that a rolled back table cannot revert transactional settings for the next one
+            worker._execute(session_settings)
+            worker.conn.commit()
+        except self.driver_error:
+            worker.close_connection()
+            raise
+        return worker
+
+    @staticmethod
+    def _load_table(worker: 'BaseBackupRestore', commands: List[Command]) -> None:
+        """
+        Loads the data of one table through a worker and commits it.
+
+        Args:
+            worker (BaseBackupRestore): The worker handler.
+            commands (List[Command]): The table's INSERT statements and COPY blocks.
+        """
+        try:
+            worker._execute(commands)
+            worker.conn.commit()
+        except worker.driver_error:
+            worker.conn.rollback()
+            raise
+
+    def close_connection(self) -> None:
+        """
+        Closes the cursor and hands the connection back to the pool, for later restores of the same database.
+        """
+        self.cursor.close()
+        try:
+            # The next user of the connection must not inherit an open transaction or the settings of this restore
+            self.conn.rollback()
+            self._reset_session()
+        except self.driver_error:
+            self.conn.close()
+            return
+        release_connection(self._pool_key(), self.conn)
+
+    def _reset_session(self) -> None:
+        """
+        Undoes the session settings that the restored statements may have changed, before the connection is
+        handed back to the pool. Runs outside of any transaction.
+        """
+
+    @classmethod
+    def read_sql_commands_from_file(cls, file_path: str) -> Iterator[Command]:
+        """
+        Reads SQL commands from a file as they are parsed.
+
+        Args:
+            file_path (str): Path to the SQL file.
+
+        Returns:
+            Iterator[Command]: SQL commands. COPY blocks are returned as (COPY statement, data) tuples.
+        """
+        return read_statements(file_path, cls.backslash_escapes, cls.copy_blocks)
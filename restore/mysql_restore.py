@@ -1,10 +1,34 @@
+import os
+import re
+import tempfile
+from functools import partial
 import pymysql
-from configuration_files.exceptions import RestoreError, DatabaseConnectionError
-from typing import List
+from configuration_files.exceptions import DatabaseConnectionError
+from restore.base import BaseBackupRestore
+from restore.sql_parser import build_insert, parse_insert, parse_row, unqualified_name
+from typing import Iterable, List, Optional, Tuple
 
+# Raised from pymysql's 16 MiB default so that large merged INSERTs fit; the server's own limit still applies
+CLIENT_MAX_ALLOWED_PACKET = 64 * 1024 * 1024
 
-class MySQLBackupRestore:
-    def __init__(self, host: str, user: str, password: str, db_name: str) -> None:
+# Run on every new restore connection. Restore connections are pooled apart from any others, so the setting
+# only carries over to later restores
+_SESSION_INIT_COMMAND = "SET foreign_key_checks = 0, unique_checks = 0"
+# Run before a connection goes back to the pool: puts the settings that dumps change back to the server defaults
+# and to those of a new connection
+_SESSION_RESET_COMMAND = (_SESSION_INIT_COMMAND + ", NAMES utf8mb4, sql_mode = DEFAULT, time_zone = DEFAULT, "
+                          "sql_notes = DEFAULT")
+
+# LOCK TABLES / UNLOCK TABLES, possibly preceded by comment lines
+_LOCK_TABLES_RE = re.compile(r"(?:\s|--[^\n]*\n)*(?:UN)?LOCK\s+TABLES\b", re.IGNORECASE)
+
+
+class MySQLBackupRestore(BaseBackupRestore):
+    driver_error = pymysql.MySQLError
+    backslash_escapes = True
+
+    def __init__(self, host: str, user: str, password: str, db_name: str, batch_size: int = 1000,
+                 load_data_threshold: int = 5000) -> None:
         """
         Initializes a MySQLBackupRestore object.
 
@@ -13,40 +37,200 @@ class MySQLBackupRestore:
             user (str): The username for accessing the MySQL server.
             password (str): The password for accessing the MySQL server.
             db_name (str): The name of the database to be restored.
+            batch_size (int): Maximum number of rows in a merged INSERT statement.
+            load_data_threshold (int): Minimum number of rows for a table to be loaded with LOAD DATA.
         """
-        self.host = host
-        self.user = user
-        self.password = password
-        self.db_name = db_name
-        try:
-            self.conn = pymysql.connect(host=host, user=user, password=password)
-        except pymysql.MySQLError as e:
-            raise DatabaseConnectionError(host, user) from e
+        super().__init__(host, user, password, db_name)
+        self.batch_size = batch_size
+        self.load_data_threshold = load_data_threshold
+        # Switched off for the rest of the restore once the server rejects LOAD DATA LOCAL
+        self.use_load_data = True
+        # Statements are committed together once the restore finishes. An idle connection left by an earlier
+        # restore is reused; a new one starts without a database, as it may not exist yet
+        self.conn = self._acquire_connection(partial(self.connect, select_db=False))
         self.cursor = self.conn.cursor()
         self.create_database_if_not_exists()
         self.conn.select_db(db_name)
+        # Merged statements are measured in characters; utf8mb4 needs up to 4 bytes per character
+        self.max_batch_length = min(self.get_max_allowed_packet(), CLIENT_MAX_ALLOWED_PACKET) // 4
 
-    def restore(self, sql_commands: List[str]) -> None:
+    def connect(self, select_db: bool = True) -> pymysql.connections.Connection:
         """
-        Executes SQL commands to restore the database.
+        Opens a connection to the server, with autocommit off.
 
         Args:
-            sql_commands (List[str]): List of SQL commands to execute for restoring the database.
+            select_db (bool): Whether to select the target database; False while it may not exist yet.
+
+        Returns:
+            pymysql.connections.Connection: The connection.
+
+        Raises:
+            DatabaseConnectionError: If the connection fails.
         """
         try:
-            for command in sql_commands:
-                if command.strip():  # Ensure the command is not empty
-                    self.cursor.execute(command)
+            return pymysql.connect(host=self.host, user=self.user, password=self.password,
+                                   database=self.db_name if select_db else None, charset='utf8mb4',
+                                   autocommit=False, local_infile=True, init_command=_SESSION_INIT_COMMAND,
+                                   max_allowed_packet=CLIENT_MAX_ALLOWED_PACKET)
         except pymysql.MySQLError as e:
-            raise RestoreError(f"An error occurred while restoring the database: {str(e)}") from e
+            raise DatabaseConnectionError(self.host, self.user) from e
+
+    def _is_usable(self, conn: pymysql.connections.Connection) -> bool:
+        try:
+            conn.ping(reconnect=False)
+        except pymysql.MySQLError:
+            return False
+        return True
+
+    def get_max_allowed_packet(self) -> int:
+        """
+        Reads the server's max_allowed_packet setting.
+
+        Returns:
+            int: The largest packet the server accepts, in bytes.
+        """
+        self.cursor.execute("SHOW VARIABLES LIKE 'max_allowed_packet';")
+        return int(self.cursor.fetchone()[1])
+
+    def _execute(self, sql_commands: Iterable[str]) -> None:
+        """
+        Executes SQL commands without committing.
+
+        Rows of consecutive INSERT statements into the same table and columns are merged into multi-row
+        INSERTs of up to `batch_size` rows, kept below the server's max_allowed_packet.
+        Every `load_data_threshold` rows of a table are loaded with LOAD DATA LOCAL INFILE instead.
+        Foreign key and unique checks are off; note that MySQL commits implicitly after DDL statements.
+
+        Args:
+            sql_commands (Iterable[str]): SQL commands to execute.
+        """
+        batch_key: Optional[Tuple[str, str]] = None
+        batch_rows: List[str] = []
+        for command in sql_commands:
+            insert = parse_insert(command, backslash_escapes=True)
+            if batch_rows and (insert is None or insert[:2] != batch_key):
+                self.insert_values(*batch_key, batch_rows)
+                batch_rows = []
+            if insert is None:
+                self.cursor.execute(command)
+            else:
+                batch_key = insert[:2]
+                batch_rows.extend(insert[2])
+                self.loaded_tables.add(unqualified_name(insert[0]))
+                # Rows are flushed as soon as they fill a LOAD DATA or INSERT batch, so memory stays bounded
+                if len(batch_rows) >= (self.load_data_threshold if self.use_load_data else self.batch_size):
+                    self.insert_values(*batch_key, batch_rows)
+                    batch_rows = []
+        if batch_rows:
+            self.insert_values(*batch_key, batch_rows)
+
+    def _skip_in_parallel(self, command: str) -> bool:
+        # Table locks would block the workers' connections
+        return _LOCK_TABLES_RE.match(command) is not None
+
+    def analyze_tables(self) -> None:
+        """
+        Refreshes the index statistics of the tables that received data.
+        """
+        if self.loaded_tables:
+            tables = ', '.join('`' + table.replace('`', '``') + '`' for table in sorted(self.loaded_tables))
+            self.cursor.execute(f"ANALYZE TABLE {tables};")
+            self.cursor.fetchall()
+            self.loaded_tables.clear()
+
+    def get_foreign_keys(self) -> List[Tuple[str, str]]:
+        """
+        Lists the foreign keys between tables of the database.
+
+        Returns:
+            List[Tuple[str, str]]: (referencing table, referenced table) pairs.
+        """
+        self.cursor.execute(
+            "SELECT TABLE_NAME, REFERENCED_TABLE_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+            "WHERE CONSTRAINT_SCHEMA = %s;",
+            (self.db_name,)
+        )
+        return list(self.cursor.fetchall())
+
+    def insert_values(self, table: str, columns: str, rows: List[str]) -> None:
+        """
+        Inserts the rows of consecutive INSERT statements into a table.
+
+        Args:
+            table (str): The target table.
+            columns (str): The parenthesized column list, or an empty string.
+            rows (List[str]): Row tuples as SQL text, e.g. "(1, 'a')", in order.
+        """
+        if self.use_load_data and len(rows) >= self.load_data_threshold and self._load_data(table, columns, rows):
+            return
+        batch: List[str] = []
+        batch_length = 0
+        for row in rows:
+            if batch and (len(batch) >= self.batch_size or batch_length + len(row) > self.max_batch_length):
+                self.cursor.execute(build_insert(table, columns, batch))
+                batch = []
+                batch_length = 0
+            batch.append(row)
+            batch_length += len(row)
+        self.cursor.execute(build_insert(table, columns, batch))
+
+    def _load_data(self, table: str, columns: str, rows: List[str]) -> bool:
+        """
+        Loads row tuples into a table through a temporary CSV file and LOAD DATA LOCAL INFILE.
+
+        Args:
+            table (str): The target table.
+            columns (str): The parenthesized column list, or an empty string.
+            rows (List[str]): Row tuples as SQL text, e.g. "(1, 'a')".
+
+        Returns:
+            bool: True if the rows were loaded, False if they have to be inserted instead.
+        """
+        # Backslash escapes and TRUE/FALSE keywords mean something else inside a CSV field
+        if any('\\' in row for row in rows):
+            return False
+        parsed_rows = [parse_row(row) for row in rows]
+        if None in parsed_rows or any(value in ('TRUE', 'FALSE') for row in parsed_rows for value in row):
+            return False
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='\n', suffix='.csv', delete=False) as file:
+            file.writelines(
+                ','.join('NULL' if value is None else '"' + value.replace('"', '""') + '"' for value in row) + '\n'
+                for row in parsed_rows
+            )
+        self.cursor.execute("SAVEPOINT load_data;")
+        try:
+            self.cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY ',' ENCLOSED BY '\"' ESCAPED BY '' LINES TERMINATED BY '\\n' {columns};",
+                (file.name,)
+            )
+        except pymysql.MySQLError:
+            # Typically local_infile is disabled on the server; plain INSERTs still work
+            self.use_load_data = False
+            return False
+        finally:
+            os.remove(file.name)
+        # With LOCAL, values that do not convert and rows with duplicate keys only raise warnings, leaving wrong
+        # values or skipped rows behind. The load is undone and the rows go through INSERTs, which fail on them
+        self.cursor.execute("SHOW COUNT(*) WARNINGS;")
+        if self.cursor.fetchone()[0]:
+            self.cursor.execute("ROLLBACK TO SAVEPOINT load_data;")
+            return False
+        self.cursor.execute("RELEASE SAVEPOINT load_data;")
+        return True
 
     def close_connection(self) -> None:
         """
-        Commits changes and closes the database connection.
+        Commits changes and hands the database connection back to the pool.
         """
         self.conn.commit()
-        self.cursor.close()
-        self.conn.close()
+        super().close_connection()
+
+    def _reset_session(self) -> None:
+        with self.conn.cursor() as cursor:
+            # Table locks outlive the transaction
+            cursor.execute("UNLOCK TABLES;")
+            cursor.execute(_SESSION_RESET_COMMAND)
 
     def database_exists(self) -> bool:
         """
@@ -55,7 +239,8 @@ class MySQLBackupRestore:
         Returns:
             bool: True if the database exists, False otherwise.
         """
-        self.cursor.execute(f"SHOW DATABASES LIKE '{self.db_name}';")
+        self.cursor.execute("SELECT SCHEMA_NAME FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = %s;",
+                            (self.db_name,))
         return self.cursor.fetchone() is not None
 
     def create_database_if_not_exists(self) -> None:
@@ -63,36 +248,6 @@ class MySQLBackupRestore:
         Creates the database if it does not exist.
         """
         if not self.database_exists():
-            self.cursor.execute(f"CREATE DATABASE {self.db_name};")
+            # Identifiers cannot be passed as parameters, so the name is quoted in backticks instead
+            self.cursor.execute("CREATE DATABASE `" + self.db_name.replace('`', '``') + "`;")
             print(f"Database '{self.db_name}' created.")
-
-    @staticmethod
-    def read_sql_commands_from_file(file_path: str) -> List[str]:
-        """
-        Reads SQL commands from a file.
-
-        Args:
-            file_path (str): Path to the SQL file.
-
-        Returns:
-            List[str]: List of SQL commands.
-        """
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read().split(';')[:-1]
-
-
-def restore_data(host: str, user: str, password: str, db_name: str, file_path: str) -> None:
-    """
-    Restores data from a SQL file.
-
-    Args:
-        host (str): The host address of the MySQL server.
-        user (str): The username for accessing the MySQL server.
-        password (str): The password for accessing the MySQL server.
-        db_name (str): The name of the database to restore data into.
-        file_path (str): Path to the SQL file containing the backup data.
-    """
-    restore_handler = MySQLBackupRestore(host, user, password, db_name)
-    sql_commands = restore_handler.read_sql_commands_from_file(file_path)
-    restore_handler.restore(sql_commands)
-    restore_handler.close_connection()
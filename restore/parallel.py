@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+
+def rank_tables(tables: Iterable[str], foreign_keys: Iterable[Tuple[str, str]]) -> List[List[str]]:
+    """
+    Groups tables into ranks so that every table comes after the tables it references.
+
+    Args:
+        tables (Iterable[str]): The tables to order.
+        foreign_keys (Iterable[Tuple[str, str]]): (referencing table, referenced table) pairs.
+
+    Returns:
+        List[List[str]]: The ranks in load order. Tables on a reference cycle share the last rank.
+    """
+    remaining = list(tables)
+    parents = {table: set() for table in remaining}
+    for child, parent in foreign_keys:
+        if child in parents and parent in parents and child != parent:
+            parents[child].add(parent)
+    ranks = []
+    loaded = set()
+    while remaining:
+        rank = [table for table in remaining if parents[table] <= loaded] or remaining
+        ranks.append(rank)
+        loaded.update(rank)
+        remaining = [table for table in remaining if table not in loaded]
+    return ranks
+
+
+def load_tables_in_parallel(ranks: List[List[str]], table_commands: Dict[str, list], workers: List[Any],
+                            load: Callable[[Any, list], None]) -> None:
+    """
+    Loads the data of each rank of tables in parallel, one table per worker at a time.
+
+    A rank starts only after every table of the previous rank has been loaded.
+
+    Args:
+        ranks (List[List[str]]): Tables in load order, as returned by rank_tables.
+        table_commands (Dict[str, list]): The data commands of each table.
+        workers (List[Any]): Restore handlers with their own connections; each loads one table at a time.
+        load (Callable[[Any, list], None]): Loads a table's commands through a worker.
+
+    Raises:
+        Exception: The first error raised by `load`.
+    """
+    idle_workers = Queue()
+    for worker in workers:
+        idle_workers.put(worker)
+
+    def load_table(table: str) -> None:
+        worker = idle_workers.get()
+        try:
+            load(worker, table_commands[table])
+        finally:
+            idle_workers.put(worker)
+
+    with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+        for rank in ranks:
+            for future in [executor.submit(load_table, table) for table in rank]:
+                future.result()
@@ -0,0 +1,74 @@
+import atexit
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, List
+
+# Idle connections kept per key; connections released beyond that, e.g. by parallel workers, are closed
+MAX_IDLE_CONNECTIONS = 8
+
+_idle_connections: Dict[Hashable, List[Any]] = defaultdict(list)
+_lock = threading.Lock()
+
+
+def acquire_connection(key: Hashable, connect: Callable[[], Any], is_usable: Callable[[Any], bool]) -> Any:
+    """
+    Takes an idle connection for a key from the pool, or opens a new one if there is none.
+
+    Args:
+        key (Hashable): Identifies the server, credentials and database the connection is for.
+        connect (Callable[[], Any]): Opens a new connection.
+        is_usable (Callable[[Any], bool]): Checks that an idle connection still works; failing ones are discarded.
+
+    Returns:
+        The connection, to be handed back with release_connection.
+    """
+    while True:
+        with _lock:
+            connections = _idle_connections.get(key)
+            if not connections:
+                break
+            conn = connections.pop()
+        if is_usable(conn):
+            return conn
+        _close_quietly(conn)
+    return connect()
+
+
+def release_connection(key: Hashable, conn: Any) -> None:
+    """
+    Hands a connection back to the pool, or closes it if the pool is full.
+
+    The connection must not be inside a transaction.
+
+    Args:
+        key (Hashable): The key the connection was acquired with.
+        conn: The connection.
+    """
+    with _lock:
+        connections = _idle_connections[key]
+        if len(connections) < MAX_IDLE_CONNECTIONS:
+            connections.append(conn)
+            return
+    _close_quietly(conn)
+
+
+def close_pool() -> None:
+    """
+    Closes all idle connections. Runs automatically when the interpreter exits.
+    """
+    with _lock:
+        connections = [conn for idle in _idle_connections.values() for conn in idle]
+        _idle_connections.clear()
+    for conn in connections:
+        _close_quietly(conn)
+
+
+def _close_quietly(conn: Any) -> None:
+    # The server may already have dropped the connection
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+atexit.register(close_pool)
@@ -1,69 +1,256 @@
+import io
+import re
 import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import AsIs
+from psycopg2.extras import execute_batch, execute_values
+from restore.base import BaseBackupRestore, Command
+from restore.pool import acquire_connection, release_connection
+from restore.sql_parser import parse_insert, parse_row, qualified_name
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
 
+# Number of consecutive statements sent to the server in one round-trip
+PIPELINE_SIZE = 100
+# Statements may end in a -- comment, so the semicolon goes on a line of its own
+_STATEMENT_SEPARATOR = '\n;\n'
+# pg_dump's call setting search_path, possibly preceded by comment lines
+_SET_CONFIG_RE = re.compile(r"(?:\s|--[^\n]*\n)*SELECT\s+pg_catalog\.set_config\(", re.IGNORECASE)
 
-class PostgresBackupRestore:
-    def __init__(self, host: str, user: str, password: str, db_name: str) -> None:
-        self.host = host
-        self.user = user
-        self.password = password
-        self.db_name = db_name
+
+class PostgresBackupRestore(BaseBackupRestore):
+    driver_error = psycopg2.Error
+    copy_blocks = True
+
+    def __init__(self, host: str, user: str, password: str, db_name: str, page_size: int = 500,
+                 copy_threshold: int = 5000) -> None:
+        super().__init__(host, user, password, db_name)
+        self.page_size = page_size
+        self.copy_threshold = copy_threshold
+        # EXECUTE prefixes of the prepared INSERT statements by (table, column list)
+        self.prepared_inserts: Dict[Tuple[str, str], str] = {}
+
+        # Options of the restore's connections to the target database; the initial connection has none
+        self.connect_options = ''
 
         # Connect to the default database to check if the target database exists
-        self.conn = psycopg2.connect(host=host, user=user, password=password, dbname='postgres')
-        self.conn.autocommit = True
+        maintenance_key = self._pool_key('postgres')
+        self.conn = acquire_connection(maintenance_key, self._connect_maintenance, self._is_usable)
         self.cursor = self.conn.cursor()
-        self.database_exists()
         # Check if the database exists, and create it if not
         self.create_database_if_not_exists()
+        # Skipping triggers, which include the foreign key checks, is reserved to superusers. The setting is a
+        # startup option, so it survives DISCARD ALL; the options are part of the pool key, so pooled connections
+        # opened with it are only reused by restores
+        self.cursor.execute("SHOW is_superuser;")
+        self.connect_options = '-c session_replication_role=replica' if self.cursor.fetchone()[0] == 'on' else ''
 
-        # Close the initial connection
-        self.close_connection()
+        # Hand the initial connection back for the next restore
+        self.cursor.close()
+        release_connection(maintenance_key, self.conn)
 
-        # Connect to the target database
-        self.conn = psycopg2.connect(host=host, user=user, password=password, dbname=db_name)
-        self.conn.autocommit = True
+        # Connect to the target database; the restore runs as a single transaction
+        self.conn = self._acquire_connection()
         self.cursor = self.conn.cursor()
 
-    def restore(self, sql_commands):
+    def connect(self) -> psycopg2.extensions.connection:
         """
-        Executes SQL commands to restore the database.
+        Opens a connection to the target database, with autocommit off.
+
+        Returns:
+            psycopg2.extensions.connection: The connection.
+        """
+        # Keepalives stop idle-looking connections from being dropped during long COPY or ANALYZE runs
+        conn = psycopg2.connect(host=self.host, user=self.user, password=self.password, dbname=self.db_name,
+                                options=self.connect_options, keepalives=1, keepalives_idle=30)
+        conn.autocommit = False
+        return conn
+
+    def _connect_maintenance(self) -> psycopg2.extensions.connection:
+        """
+        Opens an autocommit connection to the default database, from which the target database is created.
+
+        Returns:
+            psycopg2.extensions.connection: The connection.
+        """
+        conn = psycopg2.connect(host=self.host, user=self.user, password=self.password, dbname='postgres')
+        conn.autocommit = True
+        return conn
+
+    def _is_usable(self, conn: psycopg2.extensions.connection) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _execute(self, sql_commands: Iterable[Command]) -> None:
+        """
+        Executes SQL commands without committing.
+
+        A (COPY statement, data) tuple is loaded with COPY FROM STDIN. Rows of consecutive INSERT
+        statements into the same table and columns are executed through a prepared INSERT, `page_size`
+        rows per round-trip, or loaded with COPY every `copy_threshold` rows. Other statements
+        are sent PIPELINE_SIZE at a time as one multi-statement query. For superusers, triggers and foreign
+        key checks are skipped.
 
         Args:
-            sql_commands (list): List of SQL commands to execute for restoring the database.
+            sql_commands (Iterable[Command]): SQL commands to execute.
         """
+        batch_key: Optional[Tuple[str, str]] = None
+        batch_rows: List[str] = []
+        statements: List[str] = []
         for command in sql_commands:
-            self.cursor.execute(command)
+            insert = None if isinstance(command, tuple) else parse_insert(command)
+            if batch_rows and (insert is None or insert[:2] != batch_key):
+                self.insert_rows(*batch_key, batch_rows)
+                batch_rows = []
+            if statements and (insert is not None or isinstance(command, tuple) or len(statements) >= PIPELINE_SIZE):
+                self.cursor.execute(_STATEMENT_SEPARATOR.join(statements))
+                statements = []
+            if insert is not None:
+                batch_key = insert[:2]
+                batch_rows.extend(insert[2])
+                self.loaded_tables.add(qualified_name(insert[0]))
+                # Rows go to COPY as soon as they fill a batch, so memory stays bounded
+                if len(batch_rows) >= self.copy_threshold:
+                    self.insert_rows(*batch_key, batch_rows)
+                    batch_rows = []
+            elif isinstance(command, tuple):
+                copy_statement, data = command
+                self.loaded_tables.add(qualified_name(copy_statement[len('COPY'):]))
+                self.cursor.copy_expert(copy_statement, io.StringIO(data))
+            else:
+                statements.append(command)
+        if batch_rows:
+            self.insert_rows(*batch_key, batch_rows)
+        if statements:
+            self.cursor.execute(_STATEMENT_SEPARATOR.join(statements))
 
-    def close_connection(self):
-        self.cursor.close()
-        self.conn.close()
+    def _is_session_setting(self, command: str) -> bool:
+        # pg_dump empties search_path through a function call rather than a SET statement
+        return super()._is_session_setting(command) or _SET_CONFIG_RE.match(command) is not None
 
-    def database_exists(self):
-        self.cursor.execute(f"SELECT 1 FROM pg_database WHERE datname='{self.db_name}';")
-        return self.cursor.fetchone() is not None
+    def _open_worker(self, session_settings: List[Command]) -> 'PostgresBackupRestore':
+        worker = super()._open_worker(session_settings)
+        # Prepared statements belong to the connection that prepared them
+        worker.prepared_inserts = {}
+        return worker
 
-    def create_database_if_not_exists(self):
-        if not self.database_exists():
-            self.cursor.execute(f"CREATE DATABASE {self.db_name};")
-            print(f"Database '{self.db_name}' created.")
+    def analyze_tables(self) -> None:
+        """
+        Refreshes the planner statistics of the tables that received data.
+        """
+        if self.loaded_tables:
+            # Names keep their schema: the dump's header empties search_path for the rest of the session
+            tables = sql.SQL(', ').join(sql.Identifier(*name) for name in sorted(self.loaded_tables))
+            self.cursor.execute(sql.SQL("ANALYZE {};").format(tables))
+            self.conn.commit()
+            self.loaded_tables.clear()
+
+    def get_foreign_keys(self) -> List[Tuple[str, str]]:
+        """
+        Lists the foreign keys between tables of the public schema.
 
-    @staticmethod
-    def read_sql_commands_from_file(file_path: str) -> list:
+        Returns:
+            List[Tuple[str, str]]: (referencing table, referenced table) pairs.
         """
-        Reads SQL commands from a file.
+        self.cursor.execute("""
+            SELECT tc.table_name, pk.table_name
+            FROM information_schema.referential_constraints AS rc
+            JOIN information_schema.table_constraints AS tc
+              ON tc.constraint_schema = rc.constraint_schema AND tc.constraint_name = rc.constraint_name
+            JOIN information_schema.table_constraints AS pk
+              ON pk.constraint_schema = rc.unique_constraint_schema
+              AND pk.constraint_name = rc.unique_constraint_name
+            WHERE rc.constraint_schema = 'public';
+        """)
+        return list(self.cursor.fetchall())
+
+    def insert_rows(self, table: str, columns: str, rows: List[str]) -> None:
+        """
+        Inserts already-quoted row tuples into a table through its prepared INSERT, or with COPY for large groups.
+        Groups with a row that is not made of plain literals are sent as a multi-row INSERT instead.
 
         Args:
-            file_path (str): Path to the SQL file.
+            table (str): The target table.
+            columns (str): The parenthesized column list, or an empty string.
+            rows (List[str]): Row tuples as SQL text, e.g. "(1, 'a')".
+        """
+        parsed_rows = [parse_row(row) for row in rows]
+        # Rows holding DEFAULT or expressions rather than plain literals can neither be expressed as CSV nor be
+        # passed as parameters of a prepared statement
+        if None in parsed_rows:
+            execute_values(self.cursor, f"INSERT INTO {table} {columns} VALUES %s",
+                           [(AsIs(row),) for row in rows], template='%s', page_size=self.page_size)
+        elif len(rows) >= self.copy_threshold:
+            self._bulk_copy(table, columns, parsed_rows)
+        else:
+            execute_statement = self._prepare_insert(table, columns, len(parsed_rows[0]))
+            execute_batch(self.cursor, execute_statement + " %s", [(AsIs(row),) for row in rows],
+                          page_size=self.page_size)
+
+    def _prepare_insert(self, table: str, columns: str, value_count: int) -> str:
+        """
+        Prepares the INSERT statement for a table and column list on first use.
+
+        Parameter types are left to the server, which infers them from the target columns.
+
+        Args:
+            table (str): The target table.
+            columns (str): The parenthesized column list, or an empty string.
+            value_count (int): The number of values per row.
 
         Returns:
-            list: List of SQL commands.
+            str: The EXECUTE prefix for the prepared statement.
         """
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read().split(';')[:-1]
+        key = (table, columns)
+        if key not in self.prepared_inserts:
+            name = f"restore_insert_{len(self.prepared_inserts)}"
+            placeholders = ', '.join(f"${index}" for index in range(1, value_count + 1))
+            self.cursor.execute(f"PREPARE {name} AS INSERT INTO {table} {columns} VALUES ({placeholders});")
+            self.prepared_inserts[key] = f"EXECUTE {name}"
+        return self.prepared_inserts[key]
 
+    def _bulk_copy(self, table: str, columns: str, rows: List[List[Optional[str]]]) -> None:
+        """
+        Loads rows into a table with COPY FROM STDIN in CSV format.
 
-def restore_data(host, user, password, db_name, file_path):
-    restore_handler = PostgresBackupRestore(host, user, password, db_name)
-    sql_commands = restore_handler.read_sql_commands_from_file(file_path)
-    restore_handler.restore(sql_commands)
-    restore_handler.close_connection()
+        Args:
+            table (str): The target table.
+            columns (str): The parenthesized column list, or an empty string.
+            rows (List[List[Optional[str]]]): Row values as text, None for NULL.
+        """
+        # Values are always quoted so that an unquoted empty field unambiguously means NULL
+        buffer = io.StringIO()
+        buffer.writelines(
+            ','.join('' if value is None else '"' + value.replace('"', '""') + '"' for value in row) + '\n'
+            for row in rows
+        )
+        buffer.seek(0)
+        self.cursor.copy_expert(f"COPY {table} {columns} FROM STDIN WITH (FORMAT csv)", buffer)
+
+    def _pool_key(self, db_name: Optional[str] = None) -> Hashable:
+        # Connections opened with other options start their sessions with other defaults
+        return super()._pool_key(db_name) + (self.connect_options,)
+
+    def _reset_session(self) -> None:
+        # Resets search_path and the other settings of the dump and drops the prepared INSERTs. DISCARD ALL
+        # cannot run inside a transaction block, which psycopg2 opens before each statement unless in autocommit
+        self.conn.autocommit = True
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute("DISCARD ALL;")
+        finally:
+            self.conn.autocommit = False
+        self.prepared_inserts.clear()
+
+    def database_exists(self):
+        self.cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (self.db_name,))
+        return self.cursor.fetchone() is not None
+
+    def create_database_if_not_exists(self):
+        if not self.database_exists():
+            self.cursor.execute(sql.SQL("CREATE DATABASE {};").format(sql.Identifier(self.db_name)))
+            print(f"Database '{self.db_name}' created.")
@@ -1,11 +1,69 @@
-from restore.mysql_restore import MySQLBackupRestore
-from restore.postgres_restore import PostgresBackupRestore
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Callable, Iterable, Iterator
 
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sqlbackup')
+# Part of the cache key; bumped whenever the parser's output changes
+CACHE_FORMAT = 2
 
-def restore_data(db_type: str, host: str, user: str, password: str, db_name: str, file_path: str) -> None:
+
+def read_cached_commands(db_type: str, file_path: str, read_commands: Callable[[str], Iterable]) -> Iterator:
+    """
+    Reads the parsed SQL commands of a file from the parse cache, parsing and caching them on a miss.
+
+    Cache entries are keyed on the database type, the absolute path, the modification time and the size
+    of the file, so an edited dump is parsed again. Commands are pickled one by one, so neither a hit nor
+    a miss holds the whole file in memory.
+
+    Args:
+        db_type (str): Type of the database, as the parsed form differs between backends.
+        file_path (str): Path to the SQL file.
+        read_commands (Callable[[str], Iterable]): The backend's parser, used on a cache miss.
+
+    Yields:
+        The parsed SQL commands.
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.sha1(f"{CACHE_FORMAT}:{db_type}:{os.path.abspath(file_path)}".encode('utf-8')).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, f"{digest}.{stat.st_mtime_ns}.{stat.st_size}.pkl")
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as cache:
+            while True:
+                try:
+                    yield pickle.load(cache)
+                except EOFError:
+                    return
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Entries for earlier versions of the file can no longer be hit
+    with os.scandir(CACHE_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith(digest + '.'):
+                os.remove(entry.path)
+    # Written under a temporary name so an interrupted restore never leaves a truncated entry
+    fd, temp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as cache:
+            for command in read_commands(file_path):
+                pickle.dump(command, cache, pickle.HIGHEST_PROTOCOL)
+                yield command
+        os.replace(temp_path, cache_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def restore_data(db_type: str, host: str, user: str, password: str, db_name: str, file_path: str,
+                 use_cache: bool = False, jobs: int = 1) -> None:
     """
     Restores data from a SQL file into a MySQL or PostgreSQL database.
 
+    Connections are handed back to a pool afterwards, so repeated restores with the same server, credentials and
+    database skip the connection handshake. The pool is closed when the interpreter exits, or with
+    restore.pool.close_pool().
+
     Args:
         db_type (str): Type of the database. Supported values: 'mysql', 'postgres'.
         host (str): The host address of the database server.
@@ -13,17 +71,25 @@ def restore_data(db_type: str, host: str, user: str, password: str, db_name: str
         password (str): The password for accessing the database server.
         db_name (str): The name of the database to restore data into.
         file_path (str): Path to the SQL file containing the backup data.
+        use_cache (bool): Whether to reuse the parsed commands of an unchanged file from CACHE_DIR.
+        jobs (int): Number of tables to load in parallel.
 
     Raises:
         ValueError: If an unsupported database type is provided.
     """
+    # Backends are imported on demand so that only the driver in use has to be installed
     if db_type == 'mysql':
+        from restore.mysql_restore import MySQLBackupRestore
         restore_handler = MySQLBackupRestore(host, user, password, db_name)
     elif db_type == 'postgres':
+        from restore.postgres_restore import PostgresBackupRestore
         restore_handler = PostgresBackupRestore(host, user, password, db_name)
     else:
         raise ValueError(f"Unsupported database type: {db_type}")
 
-    sql_commands = restore_handler.read_sql_commands_from_file(file_path)
-    restore_handler.restore(sql_commands)
+    if use_cache:
+        sql_commands = read_cached_commands(db_type, file_path, restore_handler.read_sql_commands_from_file)
+    else:
+        sql_commands = restore_handler.read_sql_commands_from_file(file_path)
+    restore_handler.restore(sql_commands, jobs)
     restore_handler.close_connection()
@@ -0,0 +1,323 @@
+import re
+from configuration_files.exceptions import RestoreError
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+READ_BUFFER_SIZE = 1 << 20
+
+# Characters that change the parser state outside of string literals and quoted identifiers
+_TOKEN_RE = re.compile(r"--|/\*|[;'\"`]")
+_NON_SPACE_RE = re.compile(r"\S")
+# The end of a literal opened with the given quote, with and without backslash escapes
+_QUOTE_END_RE = {quote: re.compile(re.escape(quote)) for quote in "'\"`"}
+_ESCAPED_QUOTE_END_RE = {quote: re.compile(r"\\.|" + re.escape(quote), re.DOTALL) for quote in "'\"`"}
+# A COPY statement, possibly preceded by comment lines, whose data follows on the next lines
+_COPY_FROM_STDIN_RE = re.compile(r"(?:\s|--[^\n]*\n)*(COPY\s.+\sFROM\s+stdin)\s*", re.IGNORECASE | re.DOTALL)
+
+# INSERT INTO <table>, with the table optionally quoted in backticks, possibly preceded by comments
+# other than MySQL's executable /*! ... */ ones
+_INSERT_HEAD = r"(?:\s|--[^\n]*\n|/\*[^!].*?\*/)*INSERT\s+INTO\s+(`[^`]+`|[\w.]+)"
+_INSERT_HEAD_RE = re.compile(_INSERT_HEAD, re.IGNORECASE | re.DOTALL)
+# The same followed by [(<columns>)] VALUES <values>
+_INSERT_RE = re.compile(_INSERT_HEAD + r"\s*(\([^)]*\))?\s*VALUES\s*(.*\S)\s*", re.IGNORECASE | re.DOTALL)
+# The tokens split_values looks at in a VALUES list: parentheses, and whole string literals (an unterminated one
+# runs to the end), which are skipped. The regex engine scans the literals, so the loop never sees their characters
+_VALUES_TOKEN_RE = {
+    False: re.compile(r"'[^']*(?:''[^']*)*'?|[()]"),
+    True: re.compile(r"'[^'\\]*(?:(?:''|\\.)[^'\\]*)*'?|[()]", re.DOTALL),
+}
+# What may separate two row tuples of a VALUES list
+_ROW_SEPARATOR_RE = re.compile(r"\s*,\s*")
+
+
+def parse_insert(statement: str, backslash_escapes: bool = False) -> Optional[Tuple[str, str, List[str]]]:
+    """
+    Splits an INSERT ... VALUES statement into its parts.
+
+    Args:
+        statement (str): A single SQL statement without the trailing semicolon.
+        backslash_escapes (bool): Whether a backslash escapes the next character inside string literals.
+
+    Returns:
+        Optional[Tuple[str, str, List[str]]]: The table, the column list (empty if absent) and the row
+        tuples, or None if the statement is not a plain INSERT ... VALUES. Statements with anything after
+        the row tuples, such as ON CONFLICT, ON DUPLICATE KEY UPDATE or RETURNING, are not plain.
+    """
+    match = _INSERT_RE.fullmatch(statement)
+    if match is None:
+        return None
+    table, columns, values = match.groups()
+    rows = split_values(values, backslash_escapes)
+    if rows is None:
+        return None
+    return table, columns or '', rows
+
+
+def build_insert(table: str, columns: str, rows: List[str]) -> str:
+    """
+    Builds one multi-row INSERT statement from row tuples of statements sharing a table and column list.
+
+    Args:
+        table (str): The target table.
+        columns (str): The parenthesized column list, or an empty string.
+        rows (List[str]): The row tuples to concatenate.
+
+    Returns:
+        str: The combined INSERT statement.
+    """
+    return f"INSERT INTO {table} {columns} VALUES " + ',\n'.join(rows)
+
+
+def split_values(values: str, backslash_escapes: bool = False) -> Optional[List[str]]:
+    """
+    Splits the VALUES list of an INSERT statement into its parenthesized row tuples.
+
+    Args:
+        values (str): The VALUES list, e.g. "(1, 'a'),\n(2, 'b')".
+        backslash_escapes (bool): Whether a backslash escapes the next character inside string literals.
+
+    Returns:
+        Optional[List[str]]: The row tuples, each including its parentheses, or None if the list holds
+        anything other than comma-separated row tuples.
+    """
+    rows = []
+    depth = 0
+    start = 0
+    end = 0
+    for match in _VALUES_TOKEN_RE[backslash_escapes].finditer(values):
+        index = match.start()
+        char = values[index]
+        if depth == 0:
+            # Only whitespace may come before the first tuple, and a single comma between two tuples
+            gap = values[end:index]
+            separated = _ROW_SEPARATOR_RE.fullmatch(gap) is not None if rows else not gap.strip()
+            if char != '(' or not separated:
+                return None
+            start = index
+            depth = 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                end = index + 1
+                rows.append(values[start:end])
+    if depth != 0 or not rows or values[end:].strip():
+        return None
+    return rows
+
+
+# One value of a row tuple: a quoted string with doubled quotes, a number, or one of the NULL, TRUE and FALSE
+# keywords. Other bare words such as DEFAULT or CURRENT_TIMESTAMP are expressions, not literals
+_FIELD_RE = re.compile(r"\s*(?:'([^']*(?:''[^']*)*)'|([+-]?(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?)|(NULL|TRUE|FALSE))"
+                       r"\s*(?:,|$)", re.IGNORECASE)
+
+
+def parse_row(row: str) -> Optional[List[Optional[str]]]:
+    """
+    Parses a row tuple of plain literals into its values.
+
+    Args:
+        row (str): A row tuple including its parentheses, e.g. "(1, 'a', NULL)".
+
+    Returns:
+        Optional[List[Optional[str]]]: The values as text with NULL as None and TRUE/FALSE in upper case,
+        or None if the row contains anything other than quoted strings, numbers and these keywords
+        (DEFAULT, expressions, casts, ...).
+    """
+    fields: List[Optional[str]] = []
+    inner = row[1:-1]
+    position = 0
+    while position < len(inner):
+        match = _FIELD_RE.match(inner, position)
+        if match is None:
+            return None
+        quoted, number, keyword = match.groups()
+        if quoted is not None:
+            fields.append(quoted.replace("''", "'"))
+        elif number is not None:
+            fields.append(number)
+        else:
+            keyword = keyword.upper()
+            fields.append(None if keyword == 'NULL' else keyword)
+        position = match.end()
+    return fields
+
+
+def iter_statements(lines: Iterable[str], backslash_escapes: bool = False,
+                    copy_blocks: bool = False) -> Iterator[Union[str, Tuple[str, str]]]:
+    """
+    Splits SQL text into statements as it is read, ignoring semicolons inside quotes and comments.
+
+    Args:
+        lines (Iterable[str]): The SQL text, line by line, e.g. an open file.
+        backslash_escapes (bool): Whether a backslash escapes the next character inside quotes (MySQL).
+        copy_blocks (bool): Whether COPY ... FROM stdin statements are followed by data lines
+            terminated by a line holding only \\. (PostgreSQL).
+
+    Yields:
+        Union[str, Tuple[str, str]]: Each statement without its semicolon and surrounding whitespace,
+        or a (COPY statement, data) tuple for a COPY block. Empty and comment-only statements are
+        skipped, and text after the last semicolon is ignored.
+
+    Raises:
+        RestoreError: If the text ends inside a quoted string, a /* */ comment or the data of a COPY block.
+    """
+    quote_end_re = _ESCAPED_QUOTE_END_RE if backslash_escapes else _QUOTE_END_RE
+    parts: List[str] = []
+    quote = None
+    block_comment = False
+    # Whether anything besides whitespace and comments was seen since the last semicolon
+    has_content = False
+    copy_statement = None
+    copy_data: List[str] = []
+    for line in lines:
+        if copy_statement is not None:
+            if line.rstrip('\n') == '\\.':
+                yield copy_statement, ''.join(copy_data)
+                copy_statement = None
+                copy_data = []
+            else:
+                copy_data.append(line)
+            continue
+        start = 0
+        position = 0
+        while True:
+            if block_comment:
+                end = line.find('*/', position)
+                if end == -1:
+                    break
+                block_comment = False
+                position = end + 2
+            elif quote is not None:
+                match = quote_end_re[quote].search(line, position)
+                if match is None:
+                    break
+                position = match.end()
+                # A doubled quote closes and immediately reopens the literal
+                if match.group() == quote:
+                    quote = None
+            else:
+                match = _TOKEN_RE.search(line, position)
+                if not has_content:
+                    has_content = _NON_SPACE_RE.search(line, position, len(line) if match is None
+                                                       else match.start()) is not None
+                if match is None:
+                    break
+                token = match.group()
+                position = match.end()
+                if token == '--':
+                    break
+                elif token == '/*':
+                    block_comment = True
+                    # MySQL executes the contents of /*! ... */ comments
+                    has_content = has_content or line.startswith('!', position)
+                elif token != ';':
+                    quote = token
+                    has_content = True
+                else:
+                    parts.append(line[start:match.start()])
+                    statement = ''.join(parts)
+                    parts = []
+                    start = position
+                    if not has_content:
+                        continue
+                    has_content = False
+                    copy_match = _COPY_FROM_STDIN_RE.fullmatch(statement) if copy_blocks else None
+                    if copy_match is not None:
+                        copy_statement = copy_match.group(1)
+                        start = len(line)
+                        break
+                    yield statement.strip()
+        parts.append(line[start:])
+    # Everything after an unterminated literal, comment or COPY block would otherwise be dropped without notice
+    if copy_statement is not None:
+        raise RestoreError(f"The SQL file ends inside the data of {copy_statement}")
+    if quote is not None:
+        raise RestoreError(f"The SQL file ends inside a string or name quoted with {quote}")
+    if block_comment:
+        raise RestoreError("The SQL file ends inside a /* */ comment")
+
+
+def read_statements(file_path: str, backslash_escapes: bool = False,
+                    copy_blocks: bool = False) -> Iterator[Union[str, Tuple[str, str]]]:
+    """
+    Lazily reads the statements of an SQL file, see iter_statements.
+
+    Args:
+        file_path (str): Path to the SQL file.
+        backslash_escapes (bool): Whether a backslash escapes the next character inside quotes (MySQL).
+        copy_blocks (bool): Whether the file may contain COPY ... FROM stdin data blocks (PostgreSQL).
+
+    Yields:
+        Union[str, Tuple[str, str]]: Each statement, or a (COPY statement, data) tuple for a COPY block.
+    """
+    with open(file_path, 'r', encoding='utf-8', buffering=READ_BUFFER_SIZE) as file:
+        yield from iter_statements(file, backslash_escapes, copy_blocks)
+
+
+def data_table(command: Union[str, Tuple[str, str]]) -> Optional[str]:
+    """
+    Names the table that an INSERT statement or a COPY block loads data into.
+
+    Args:
+        command (Union[str, Tuple[str, str]]): A statement, or a (COPY statement, data) tuple.
+
+    Returns:
+        Optional[str]: The table name without schema or quotes, or None if the command loads no data.
+    """
+    if isinstance(command, tuple):
+        table = command[0].split()[1]
+    else:
+        # Also INSERTs that are not plain INSERT ... VALUES, so that they run after the table's other rows
+        match = _INSERT_HEAD_RE.match(command)
+        if match is None:
+            return None
+        table = match.group(1)
+    return unqualified_name(table)
+
+
+def unqualified_name(table: str) -> str:
+    """
+    Strips the schema and the quotes from a table name as written in a statement.
+
+    Args:
+        table (str): The table name, e.g. public.users or `users`.
+
+    Returns:
+        str: The bare table name.
+    """
+    return table.split('.')[-1].strip('`"')
+
+
+# One part of a dotted name: a double-quoted or backquoted identifier with doubled quotes, or a bare word
+_NAME_PART_RE = re.compile(r'\s*(?:"((?:[^"]|"")*)"|`((?:[^`]|``)*)`|([^."`\s(),;]+))\s*')
+
+
+def qualified_name(table: str) -> Tuple[str, ...]:
+    """
+    Splits a table name into its schema and table parts, as PostgreSQL resolves them.
+
+    Args:
+        table (str): The table name as written in a statement, e.g. public.users or "Sales"."Orders",
+            possibly followed by the rest of the statement.
+
+    Returns:
+        Tuple[str, ...]: The unquoted parts; parts that were not quoted are folded to lower case.
+    """
+    parts = []
+    position = 0
+    while True:
+        match = _NAME_PART_RE.match(table, position)
+        if match is None:
+            break
+        double_quoted, backquoted, bare = match.groups()
+        if double_quoted is not None:
+            parts.append(double_quoted.replace('""', '"'))
+        elif backquoted is not None:
+            parts.append(backquoted.replace('``', '`'))
+        else:
+            parts.append(bare.lower())
+        if not table.startswith('.', match.end()):
+            break
+        position = match.end() + 1
+    return tuple(parts)
@@ -0,0 +1,97 @@
+import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from backup.parallel import close_connection_pool, map_bounded, open_connection_pool
+
+
+class RecordingExecutor:
+    """Runs each call on submit, or leaves its future pending for the items in `pending`."""
+
+    def __init__(self, pending=()):
+        self.pending = set(pending)
+        self.futures = []
+
+    def submit(self, function, item):
+        future = Future()
+        if item not in self.pending:
+            future.set_result(function(item))
+        self.futures.append(future)
+        return future
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class MapBoundedTest(unittest.TestCase):
+    def test_results_come_in_item_order(self):
+        delays = [0.03, 0.02, 0.01, 0]
+
+        def wait(delay):
+            time.sleep(delay)
+            return delay
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(list(map_bounded(executor, wait, delays, 4)), delays)
+
+    def test_submits_at_most_window_calls_ahead(self):
+        executor = RecordingExecutor()
+        results = []
+        for consumed, result in enumerate(map_bounded(executor, lambda item: item * 2, range(10), 3)):
+            self.assertLessEqual(len(executor.futures) - consumed, 3)
+            results.append(result)
+        self.assertEqual(results, [item * 2 for item in range(10)])
+
+    def test_empty_items(self):
+        self.assertEqual(list(map_bounded(RecordingExecutor(), str, [], 2)), [])
+
+    def test_raises_the_error_of_a_call(self):
+        def fail(item):
+            raise ValueError(item)
+
+        with self.assertRaises(ValueError):
+            list(map_bounded(RecordingExecutor(), fail, [1], 2))
+
+    def test_stopping_early_cancels_pending_calls(self):
+        executor = RecordingExecutor(pending={1})
+        results = map_bounded(executor, str, range(5), 2)
+        self.assertEqual(next(results), '0')
+        results.close()
+        self.assertEqual(len(executor.futures), 2)
+        self.assertTrue(executor.futures[1].cancelled())
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def test_open_and_close(self):
+        connections = []
+
+        def connect():
+            connections.append(FakeConnection())
+            return connections[-1]
+
+        pool = open_connection_pool(connect, 3)
+        self.assertEqual(pool.qsize(), 3)
+        close_connection_pool(pool)
+        self.assertTrue(pool.empty())
+        self.assertTrue(all(conn.closed for conn in connections))
+
+    def test_failed_connect_closes_the_opened_connections(self):
+        connections = []
+
+        def connect():
+            if len(connections) == 2:
+                raise ConnectionError
+            connections.append(FakeConnection())
+            return connections[-1]
+
+        with self.assertRaises(ConnectionError):
+            open_connection_pool(connect, 3)
+        self.assertTrue(all(conn.closed for conn in connections))
+
+
+if __name__ == '__main__':
+    unittest.main()
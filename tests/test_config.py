@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from configuration_files import config
+from configuration_files.config import read_config
+from configuration_files.exceptions import ConfigError
+
+CONFIG = """[mysql]
+host = localhost
+user = root
+password = secret
+db_name = {}
+"""
+
+
+class ReadConfigTest(unittest.TestCase):
+    def setUp(self):
+        config._read_config_cached.cache_clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.config_path = os.path.join(directory.name, 'db.cfg')
+        self.write_config('shop')
+
+    def write_config(self, db_name, mtime_ns=None):
+        with open(self.config_path, 'w') as file:
+            file.write(CONFIG.format(db_name))
+        if mtime_ns is not None:
+            os.utime(self.config_path, ns=(mtime_ns, mtime_ns))
+
+    def test_reads_the_connection_parameters(self):
+        self.assertEqual(read_config(self.config_path), {'host': 'localhost', 'user': 'root', 'password': 'secret',
+                                                         'db_name': 'shop', 'db_type': 'mysql'})
+
+    def test_unchanged_file_is_parsed_once(self):
+        read_config(self.config_path)
+        read_config(self.config_path)
+        self.assertEqual(config._read_config_cached.cache_info().misses, 1)
+
+    def test_relative_and_absolute_paths_share_the_entry(self):
+        read_config(self.config_path)
+        read_config(os.path.relpath(self.config_path))
+        self.assertEqual(config._read_config_cached.cache_info().misses, 1)
+
+    def test_edited_file_is_parsed_again(self):
+        self.write_config('shop', mtime_ns=1_000_000_000)
+        read_config(self.config_path)
+        self.write_config('blog', mtime_ns=2_000_000_000)
+        self.assertEqual(read_config(self.config_path)['db_name'], 'blog')
+
+    def test_callers_get_their_own_copy(self):
+        read_config(self.config_path)['db_name'] = 'changed'
+        self.assertEqual(read_config(self.config_path)['db_name'], 'shop')
+
+    def test_missing_file(self):
+        with self.assertRaises(ConfigError):
+            read_config(self.config_path + '.missing')
+
+    def test_file_without_sections(self):
+        with open(self.config_path, 'w') as file:
+            file.write("")
+        with self.assertRaises(ConfigError):
+            read_config(self.config_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
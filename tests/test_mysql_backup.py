@@ -0,0 +1,41 @@
+import unittest
+from unittest import mock
+from backup import mysql_backup
+from backup.mysql_backup import _chunk_insert_statements
+
+PREFIX = "INSERT INTO `t` (`a`) VALUES "
+
+
+class ChunkInsertStatementsTest(unittest.TestCase):
+    def test_single_statement(self):
+        self.assertEqual(list(_chunk_insert_statements(PREFIX, ["(1)", "(2)"])), [PREFIX + "(1),\n(2);\n"])
+
+    def test_no_rows(self):
+        self.assertEqual(list(_chunk_insert_statements(PREFIX, [])), [])
+
+    @mock.patch.object(mysql_backup, 'MAX_INSERT_ROWS', 2)
+    def test_row_limit(self):
+        self.assertEqual(list(_chunk_insert_statements(PREFIX, ["(1)", "(2)", "(3)", "(4)", "(5)"])),
+                         [PREFIX + "(1),\n(2);\n", PREFIX + "(3),\n(4);\n", PREFIX + "(5);\n"])
+
+    @mock.patch.object(mysql_backup, 'MAX_INSERT_SIZE', len(PREFIX) + 10)
+    def test_size_limit(self):
+        statements = list(_chunk_insert_statements(PREFIX, ["(1)", "(2)", "(3)", "(4)"]))
+        self.assertEqual(statements, [PREFIX + "(1),\n(2);\n", PREFIX + "(3),\n(4);\n"])
+        for statement in statements:
+            self.assertLessEqual(len(statement.encode('utf-8')), mysql_backup.MAX_INSERT_SIZE)
+
+    @mock.patch.object(mysql_backup, 'MAX_INSERT_SIZE', len(PREFIX) + 14)
+    def test_size_limit_counts_bytes(self):
+        # Each tuple is 5 characters but 6 bytes in UTF-8: both would fit in 14 characters, but not in 14 bytes
+        self.assertEqual(list(_chunk_insert_statements(PREFIX, ["('é')", "('é')"])),
+                         [PREFIX + "('é');\n", PREFIX + "('é');\n"])
+
+    @mock.patch.object(mysql_backup, 'MAX_INSERT_SIZE', len(PREFIX) + 10)
+    def test_oversized_row_gets_its_own_statement(self):
+        self.assertEqual(list(_chunk_insert_statements(PREFIX, ["(1)", "('long value')", "(2)"])),
+                         [PREFIX + "(1);\n", PREFIX + "('long value');\n", PREFIX + "(2);\n"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import threading
+import unittest
+from restore.parallel import load_tables_in_parallel, rank_tables
+
+
+class RankTablesTest(unittest.TestCase):
+    def test_without_foreign_keys(self):
+        self.assertEqual(rank_tables(['a', 'b'], []), [['a', 'b']])
+
+    def test_referenced_tables_come_first(self):
+        self.assertEqual(rank_tables(['orders', 'items', 'users'], [('orders', 'users'), ('items', 'orders')]),
+                         [['users'], ['orders'], ['items']])
+
+    def test_ignores_self_references_and_unknown_tables(self):
+        self.assertEqual(rank_tables(['a', 'b'], [('a', 'a'), ('b', 'other'), ('other', 'a')]), [['a', 'b']])
+
+    def test_cycles_share_the_last_rank(self):
+        ranks = rank_tables(['a', 'b', 'c', 'd'], [('a', 'b'), ('b', 'a'), ('c', 'a'), ('a', 'd')])
+        self.assertEqual(ranks, [['d'], ['a', 'b', 'c']])
+
+
+class LoadTablesInParallelTest(unittest.TestCase):
+    def test_loads_every_table_rank_by_rank(self):
+        loaded = []
+        lock = threading.Lock()
+
+        def load(worker, commands):
+            with lock:
+                loaded.append(commands[0])
+
+        ranks = [['a', 'b'], ['c']]
+        load_tables_in_parallel(ranks, {'a': ['a'], 'b': ['b'], 'c': ['c']}, ['w1', 'w2'], load)
+        self.assertEqual(sorted(loaded[:2]), ['a', 'b'])
+        self.assertEqual(loaded[2], 'c')
+
+    def test_raises_the_first_error(self):
+        def load(worker, commands):
+            raise ValueError(commands[0])
+
+        with self.assertRaises(ValueError):
+            load_tables_in_parallel([['a']], {'a': ['a']}, ['w1'], load)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+from restore import pool
+
+
+class FakeConnection:
+    def __init__(self, usable=True):
+        self.usable = usable
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class PoolTest(unittest.TestCase):
+    def setUp(self):
+        pool.close_pool()
+        self.addCleanup(pool.close_pool)
+        self.opened = []
+
+    def connect(self):
+        self.opened.append(FakeConnection())
+        return self.opened[-1]
+
+    def acquire(self, key='db'):
+        return pool.acquire_connection(key, self.connect, lambda conn: conn.usable)
+
+    def test_released_connection_is_reused(self):
+        conn = self.acquire()
+        pool.release_connection('db', conn)
+        self.assertIs(self.acquire(), conn)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_keys_do_not_share_connections(self):
+        pool.release_connection('db', self.acquire())
+        self.assertIsNot(self.acquire('other'), self.opened[0])
+        self.assertEqual(len(self.opened), 2)
+
+    def test_unusable_connection_is_closed_and_replaced(self):
+        conn = self.acquire()
+        conn.usable = False
+        pool.release_connection('db', conn)
+        self.assertIsNot(self.acquire(), conn)
+        self.assertTrue(conn.closed)
+
+    def test_connections_beyond_the_limit_are_closed(self):
+        with mock.patch.object(pool, 'MAX_IDLE_CONNECTIONS', 2):
+            connections = [self.acquire() for _ in range(3)]
+            for conn in connections:
+                pool.release_connection('db', conn)
+        self.assertEqual([conn.closed for conn in connections], [False, False, True])
+
+    def test_close_pool_closes_idle_connections(self):
+        conn = self.acquire()
+        pool.release_connection('db', conn)
+        pool.close_pool()
+        self.assertTrue(conn.closed)
+        self.assertIsNot(self.acquire(), conn)
+
+
+if __name__ == '__main__':
+    unittest.main()
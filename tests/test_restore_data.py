@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from restore import restore_data
+from restore.restore_data import read_cached_commands
+
+
+class ReadCachedCommandsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = os.path.join(directory.name, 'cache')
+        patcher = mock.patch.object(restore_data, 'CACHE_DIR', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.file_path = os.path.join(directory.name, 'dump.sql')
+        self.write_dump("SELECT 1;\nSELECT 2;\n")
+        self.parsed = []
+
+    def write_dump(self, text):
+        with open(self.file_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+    def read_commands(self, file_path):
+        self.parsed.append(file_path)
+        with open(file_path, encoding='utf-8') as file:
+            for statement in file.read().split(';'):
+                if statement.strip():
+                    yield statement.strip()
+        yield ('COPY t FROM stdin', '1\n')
+
+    def read(self, db_type='mysql'):
+        return list(read_cached_commands(db_type, self.file_path, self.read_commands))
+
+    def cache_entries(self):
+        return os.listdir(self.cache_dir) if os.path.isdir(self.cache_dir) else []
+
+    def test_miss_parses_and_caches(self):
+        self.assertEqual(self.read(), ["SELECT 1", "SELECT 2", ('COPY t FROM stdin', '1\n')])
+        self.assertEqual(len(self.parsed), 1)
+        self.assertEqual(len(self.cache_entries()), 1)
+
+    def test_hit_reads_the_cache(self):
+        expected = self.read()
+        self.assertEqual(self.read(), expected)
+        self.assertEqual(len(self.parsed), 1)
+
+    def test_edited_file_is_parsed_again(self):
+        self.read()
+        self.write_dump("SELECT 3;\n")
+        self.assertEqual(self.read(), ["SELECT 3", ('COPY t FROM stdin', '1\n')])
+        self.assertEqual(len(self.parsed), 2)
+        # The entry for the earlier version is removed
+        self.assertEqual(len(self.cache_entries()), 1)
+
+    def test_database_types_are_cached_apart(self):
+        self.read('mysql')
+        self.read('postgres')
+        self.assertEqual(len(self.parsed), 2)
+        self.assertEqual(len(self.cache_entries()), 2)
+
+    def test_partial_read_leaves_no_entry(self):
+        commands = read_cached_commands('mysql', self.file_path, self.read_commands)
+        next(commands)
+        commands.close()
+        self.assertEqual(self.cache_entries(), [])
+        self.read()
+        self.assertEqual(len(self.parsed), 2)
+
+    def test_parse_error_leaves_no_entry(self):
+        def fail(file_path):
+            yield "SELECT 1"
+            raise ValueError(file_path)
+
+        with self.assertRaises(ValueError):
+            list(read_cached_commands('mysql', self.file_path, fail))
+        self.assertEqual(self.cache_entries(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import io
+import unittest
+from configuration_files.exceptions import RestoreError
+from restore.sql_parser import (build_insert, data_table, iter_statements, parse_insert, parse_row,
+                                qualified_name, split_values, unqualified_name)
+
+
+def statements(text: str, **kwargs) -> list:
+    return list(iter_statements(io.StringIO(text), **kwargs))
+
+
+class IterStatementsTest(unittest.TestCase):
+    def test_splits_on_semicolons(self):
+        self.assertEqual(statements("SELECT 1;\nSELECT 2;\n"), ["SELECT 1", "SELECT 2"])
+
+    def test_ignores_semicolons_in_quotes(self):
+        text = "INSERT INTO t VALUES ('a;b', \"c;d\", `e;f`);\nSELECT 'it''s;';\n"
+        self.assertEqual(statements(text), ["INSERT INTO t VALUES ('a;b', \"c;d\", `e;f`)", "SELECT 'it''s;'"])
+
+    def test_keeps_quoted_text_across_lines(self):
+        self.assertEqual(statements("SELECT 'a;\nb';\n"), ["SELECT 'a;\nb'"])
+
+    def test_ignores_semicolons_in_comments(self):
+        text = "-- one; two\nSELECT 1 /* three; */;\n/* four;\nfive; */ SELECT 2;\n"
+        self.assertEqual(statements(text), ["-- one; two\nSELECT 1 /* three; */", "/* four;\nfive; */ SELECT 2"])
+
+    def test_skips_empty_and_comment_only_statements(self):
+        text = "-- only a comment;\n;;\n  /* x; */ ;\nSELECT 1 -- tail\n;\n"
+        self.assertEqual(statements(text), ["SELECT 1 -- tail"])
+
+    def test_keeps_mysql_executable_comments(self):
+        self.assertEqual(statements("/*!40101 SET @OLD=1 */;\n"), ["/*!40101 SET @OLD=1 */"])
+
+    def test_ignores_text_after_the_last_semicolon(self):
+        self.assertEqual(statements("SELECT 1;\nSELECT 2"), ["SELECT 1"])
+
+    def test_backslash_escapes(self):
+        text = "INSERT INTO t VALUES ('a\\';b');\nSELECT 2;\n"
+        self.assertEqual(statements(text, backslash_escapes=True), ["INSERT INTO t VALUES ('a\\';b')", "SELECT 2"])
+        # Without escapes the backslash is an ordinary character: the quote closes the literal, and the
+        # next one opens a literal that is never closed
+        with self.assertRaises(RestoreError):
+            statements(text)
+
+    def test_unterminated_literal_raises(self):
+        with self.assertRaises(RestoreError):
+            statements("SELECT 1;\nSELECT 'a;\nSELECT 2;\n")
+
+    def test_unclosed_comment_raises(self):
+        with self.assertRaises(RestoreError):
+            statements("SELECT 1;\n/* a;\nSELECT 2;\n")
+
+    def test_copy_blocks(self):
+        text = ("-- Data\nCOPY public.t (a, b) FROM stdin;\n1\tx;y\n2\t'\n\\.\n\n"
+                "SELECT 1;\n")
+        self.assertEqual(statements(text, copy_blocks=True),
+                         [("COPY public.t (a, b) FROM stdin", "1\tx;y\n2\t'\n"), "SELECT 1"])
+
+    def test_copy_block_without_terminator_raises(self):
+        with self.assertRaises(RestoreError):
+            statements("COPY public.t (a) FROM stdin;\n1\n2\nSELECT 1;\n", copy_blocks=True)
+
+    def test_copy_data_is_ordinary_text_without_copy_blocks(self):
+        self.assertEqual(statements("COPY t FROM stdin;\n1\n\\.\n"), ["COPY t FROM stdin"])
+
+
+class ParseInsertTest(unittest.TestCase):
+    def test_plain_insert(self):
+        self.assertEqual(parse_insert("INSERT INTO `t` (`a`, `b`) VALUES (1, 'x'),\n(2, NULL)"),
+                         ("`t`", "(`a`, `b`)", ["(1, 'x')", "(2, NULL)"]))
+
+    def test_without_columns(self):
+        self.assertEqual(parse_insert("-- comment\ninsert into public.t values (1)"), ("public.t", "", ["(1)"]))
+
+    def test_not_an_insert(self):
+        self.assertIsNone(parse_insert("SELECT 1"))
+        self.assertIsNone(parse_insert("INSERT INTO t SELECT * FROM u"))
+
+    def test_trailing_clauses_are_not_plain(self):
+        self.assertIsNone(parse_insert("INSERT INTO t VALUES (1) ON CONFLICT DO NOTHING"))
+        self.assertIsNone(parse_insert("INSERT INTO t VALUES (1) ON DUPLICATE KEY UPDATE a = 1"))
+        self.assertIsNone(parse_insert("INSERT INTO t VALUES (1), (2) RETURNING id"))
+
+    def test_build_insert(self):
+        self.assertEqual(build_insert("t", "(a)", ["(1)", "(2)"]), "INSERT INTO t (a) VALUES (1),\n(2)")
+
+
+class SplitValuesTest(unittest.TestCase):
+    def test_splits_row_tuples(self):
+        self.assertEqual(split_values("(1, 'a'),\n(2, 'b')"), ["(1, 'a')", "(2, 'b')"])
+
+    def test_ignores_parentheses_and_commas_in_literals(self):
+        self.assertEqual(split_values("(1, 'a), (b'), (2, 'it''s')"), ["(1, 'a), (b')", "(2, 'it''s')"])
+
+    def test_nested_parentheses(self):
+        self.assertEqual(split_values("(1, f(2, 3)), (4)"), ["(1, f(2, 3))", "(4)"])
+
+    def test_backslash_escapes(self):
+        self.assertEqual(split_values("('a\\'), ('), (2)", backslash_escapes=True), ["('a\\'), (')", "(2)"])
+
+    def test_rejects_anything_but_comma_separated_tuples(self):
+        for values in ["(1) ON CONFLICT DO NOTHING", "(1)(2)", "(1),,(2)", "'a'", "(1))", "", "(1, 'a"]:
+            with self.subTest(values=values):
+                self.assertIsNone(split_values(values))
+
+
+class ParseRowTest(unittest.TestCase):
+    def test_literals(self):
+        self.assertEqual(parse_row("(1, 'it''s', NULL, -2.5, '')"), ['1', "it's", None, '-2.5', ''])
+
+    def test_numbers(self):
+        self.assertEqual(parse_row("(0, +7, 1.5, .5, 2., 1e10, -3E-2)"),
+                         ['0', '+7', '1.5', '.5', '2.', '1e10', '-3E-2'])
+
+    def test_keywords(self):
+        self.assertEqual(parse_row("('NULL', null, true, FALSE)"), ['NULL', None, 'TRUE', 'FALSE'])
+
+    def test_expressions_are_rejected(self):
+        for row in ["(1, now())", "('1'::int)", "(1::int, 2)", "(1+1)", "(@v)", "(0x1F)", "(x'1F')"]:
+            with self.subTest(row=row):
+                self.assertIsNone(parse_row(row))
+
+    def test_other_bare_words_are_rejected(self):
+        for row in ["(DEFAULT, 1)", "(1, default)", "(CURRENT_TIMESTAMP, 1)", "(1, nullable)"]:
+            with self.subTest(row=row):
+                self.assertIsNone(parse_row(row))
+
+
+class TableNameTest(unittest.TestCase):
+    def test_data_table(self):
+        self.assertEqual(data_table("INSERT INTO public.users VALUES (1)"), "users")
+        self.assertEqual(data_table("INSERT INTO `users` VALUES (1) ON DUPLICATE KEY UPDATE id = 1"), "users")
+        self.assertEqual(data_table(("COPY public.orders (id) FROM stdin", "1\n")), "orders")
+        self.assertIsNone(data_table("CREATE TABLE users (id int)"))
+
+    def test_unqualified_name(self):
+        self.assertEqual(unqualified_name("public.users"), "users")
+        self.assertEqual(unqualified_name("`users`"), "users")
+
+    def test_qualified_name(self):
+        self.assertEqual(qualified_name("public.Users"), ("public", "users"))
+        self.assertEqual(qualified_name('"Sales"."Or""ders" (id) FROM stdin'), ("Sales", 'Or"ders'))
+        self.assertEqual(qualified_name(" public.users(a, b)"), ("public", "users"))
+
+
+if __name__ == '__main__':
+    unittest.main()